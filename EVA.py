@@ -1,6 +1,7 @@
 import re
 from discord.commands.context import ApplicationContext
 from typing import List, Optional
+from logging import DEBUG
 from discord.ext import commands
 from datetime import datetime
 from decouple import config
@@ -105,6 +106,12 @@ class Eva(commands.Cog, AppLogger):
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        self.logger.debug(
-            f"Message sent in the chats from {message.author.name}: {message.content}"
+        self.log_event(
+            "message",
+            "Message sent in the chats from %s",
+            message.author.name,
+            level=DEBUG,
+            author_id=message.author.id,
+            channel_id=message.channel.id,
+            length=len(message.content),
         )
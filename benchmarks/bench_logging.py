@@ -0,0 +1,115 @@
+"""
+Event loop latency while a flood of messages is logged, with the handlers
+called on the loop and with the queued AppLogger handlers.
+
+The flood logs a line per message like Eva.on_message does, yielding to the
+loop between small batches, and times how long every logging call blocks the
+loop. A ticker task sleeps for 1ms in a loop and records how late it wakes
+up. The file handler rotates every few MiB, like discord.log does at 32 MiB.
+The slow disk runs emulate a busy or network volume by adding 0.2ms to every
+write.
+
+Run from the project root: python -m benchmarks.bench_logging
+"""
+from logging import DEBUG, Formatter, Logger, LogRecord, getLogger, handlers
+from time import perf_counter, sleep
+import asyncio
+import os
+import tempfile
+
+from utils.logger import AppLogger
+
+MESSAGES = 20_000
+BATCH = 10
+TICK = 0.001
+SLOW_WRITE = 0.0002
+
+
+class SlowRotatingFileHandler(handlers.RotatingFileHandler):
+    def emit(self, record: LogRecord) -> None:
+        sleep(SLOW_WRITE)
+        super().emit(record)
+
+
+def file_handler(directory: str, slow: bool) -> handlers.RotatingFileHandler:
+    cls = SlowRotatingFileHandler if slow else handlers.RotatingFileHandler
+    handler = cls(
+        filename=os.path.join(directory, "discord.log"),
+        encoding="utf-8",
+        maxBytes=1024 * 1024,
+        backupCount=5,
+    )
+    handler.setFormatter(
+        Formatter("[{asctime}] [{levelname:<8}] {name}: {message}", style="{")
+    )
+    return handler
+
+
+async def ticker(lags: list, done: asyncio.Event) -> None:
+    while not done.is_set():
+        start = perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(perf_counter() - start - TICK)
+
+
+async def flood(logger: Logger, calls: list, done: asyncio.Event) -> None:
+    for i in range(MESSAGES):
+        start = perf_counter()
+        logger.info(f"New message received from: member-{i % 500} (Member {i})")
+        calls.append(perf_counter() - start)
+        if i % BATCH == 0:
+            await asyncio.sleep(0)
+    done.set()
+
+
+async def measure(logger: Logger):
+    calls, lags = [], []
+    done = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, done))
+    await flood(logger, calls, done)
+    await tick
+    return calls, lags
+
+
+def percentile(values: list, p: float) -> float:
+    return sorted(values)[int((len(values) - 1) * p)] * 1000
+
+
+def report(name: str, calls: list, lags: list, dropped: int) -> None:
+    print(
+        f"{name:>16} {percentile(calls, 0.5):>10.4f} {percentile(calls, 0.999):>10.4f} "
+        f"{max(calls) * 1000:>10.3f} {percentile(lags, 0.5):>10.3f} "
+        f"{percentile(lags, 0.99):>10.3f} {dropped:>8}"
+    )
+
+
+def run(slow: bool, queued: bool) -> None:
+    name = f"{'queued' if queued else 'direct'} {'slow' if slow else 'local'}"
+    with tempfile.TemporaryDirectory() as directory:
+        app = AppLogger()
+        app.logger = getLogger(f"bench.{name}")
+        app.logger.propagate = False
+        app.logger.setLevel(DEBUG)
+        handler = file_handler(directory, slow)
+        if queued:
+            app.add_queued_handlers(handler, maxsize=10_000)
+        else:
+            app.logger.addHandler(handler)
+        calls, lags = asyncio.run(measure(app.logger))
+        report(name, calls, lags, app.dropped_records if queued else 0)
+        app.stop_queue()
+        handler.close()
+
+
+def main():
+    print(
+        f"{'mode':>16} {'call p50':>10} {'call p99.9':>10} {'call max':>10} "
+        f"{'lag p50':>10} {'lag p99':>10} {'dropped':>8}"
+    )
+    for slow in (False, True):
+        for queued in (False, True):
+            run(slow, queued)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup cost of decoding a synthetic member_times.json with 100k members,
+using the previous dateutil/from_union decoder and the current one.
+
+Run from the project root: python -m benchmarks.bench_member_decode
+"""
+from datetime import datetime, timedelta
+from time import perf_counter
+import tempfile
+import json
+import os
+
+from models.member_time import (
+    MemberTimeDataclass,
+    from_float,
+    from_list,
+    from_none,
+    from_union,
+    member_time_dataclass_from_dict,
+    member_time_dataclass_to_dict,
+)
+import dateutil.parser
+
+MEMBERS = 100_000
+
+
+def legacy_from_datetime(x):
+    return dateutil.parser.parse(x)
+
+
+def legacy_from_dict(obj) -> MemberTimeDataclass:
+    return MemberTimeDataclass(
+        name=obj.get("name"),
+        id=obj.get("id"),
+        highest_role_id=obj.get("highest_role_id"),
+        connected_at=legacy_from_datetime(obj.get("connected_at")),
+        disconnected_at=from_union(
+            [from_none, legacy_from_datetime], obj.get("disconnected_at")
+        ),
+        last_connected_by=from_union(
+            [from_float, from_none], obj.get("last_connected_by")
+        ),
+        expected_exponential_intervals=from_union(
+            [lambda x: from_list(from_float, x), from_none],
+            obj.get("expected_exponential_intervals"),
+        ),
+        total_minutes_connected=obj.get("total_minutes_connected"),
+        last_connected_at=from_union(
+            [from_none, legacy_from_datetime], obj.get("last_connected_at")
+        ),
+    )
+
+
+def build_file(file: str) -> None:
+    now = datetime.now()
+    members = [
+        MemberTimeDataclass(
+            name=f"member-{i}",
+            id=100_000_000_000_000_000 + i,
+            highest_role_id=1,
+            connected_at=now - timedelta(minutes=i),
+            # Half of the members are still connected
+            disconnected_at=now if i % 2 else None,
+            last_connected_at=now - timedelta(days=1),
+            last_connected_by=timedelta(minutes=i % 300) if i % 2 else None,
+            expected_exponential_intervals=[12000.0 * 1.5**k for k in range(8)],
+            total_minutes_connected=float(i),
+        )
+        for i in range(MEMBERS)
+    ]
+    with open(file, "w") as f:
+        json.dump(member_time_dataclass_to_dict(members), f)
+
+
+def measure(file: str, decode) -> float:
+    start = perf_counter()
+    with open(file, "r") as f:
+        decode(json.load(f))
+    return perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        file = os.path.join(directory, "member_times.json")
+        build_file(file)
+        print(f"{MEMBERS} members, {os.path.getsize(file) / 1024 / 1024:.1f} MiB")
+
+        legacy = measure(file, lambda data: [legacy_from_dict(x) for x in data])
+        current = measure(file, member_time_dataclass_from_dict)
+        print(f"legacy decoder:  {legacy:.2f}s")
+        print(f"current decoder: {current:.2f}s ({legacy / current:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Per member memory footprint of MemberTimeDataclass with and without slots,
+and with the intervals shared like the storages load them, measured with
+tracemalloc at 100k tracked members.
+
+Run from the project root: python -m benchmarks.bench_member_memory
+"""
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+import tracemalloc
+import gc
+
+from models.member_time import MemberTimeDataclass, share_intervals
+
+MEMBERS = 100_000
+
+# Same fields as the model, without slots, like it was declared before
+DictMemberTimeDataclass = dataclass(order=True)(
+    type(
+        "DictMemberTimeDataclass",
+        (),
+        {
+            "__annotations__": {
+                field.name: field.type for field in fields(MemberTimeDataclass)
+            },
+            **{
+                field.name: field.default
+                for field in fields(MemberTimeDataclass)
+                if field.default is not field.default_factory
+            },
+        },
+    )
+)
+
+
+def build(cls):
+    now = datetime.now()
+    return [
+        cls(
+            name=f"member-{i}",
+            id=100_000_000_000_000_000 + i,
+            highest_role_id=1,
+            connected_at=now - timedelta(minutes=i),
+            disconnected_at=now,
+            last_connected_at=now - timedelta(days=1),
+            last_connected_by=timedelta(minutes=i % 300),
+            expected_exponential_intervals=[12000.0 * 1.5**k for k in range(8)],
+            total_minutes_connected=float(i),
+        )
+        for i in range(MEMBERS)
+    ]
+
+
+def measure(cls, shared: bool = False) -> float:
+    gc.collect()
+    tracemalloc.start()
+    members = build(cls)
+    if shared:
+        share_intervals(members)
+        gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del members
+    return size / MEMBERS
+
+
+def main():
+    before = measure(DictMemberTimeDataclass)
+    slots = measure(MemberTimeDataclass)
+    shared = measure(MemberTimeDataclass, shared=True)
+    print(f"{MEMBERS} members")
+    print(f"{'with __dict__:':<30} {before:.0f} bytes/member")
+    for label, size in (("with slots:", slots), ("with slots, shared intervals:", shared)):
+        print(f"{label:<30} {size:.0f} bytes/member ({1 - size / before:.0%} less)")
+
+if __name__ == "__main__":
+    main()
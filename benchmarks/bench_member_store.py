@@ -0,0 +1,63 @@
+"""
+Compares the previous list scans of the Observer cog with the indexed
+MemberTimeRepository.
+
+Run from the project root: python -m benchmarks.bench_member_store
+"""
+from datetime import datetime
+from timeit import timeit
+import random
+
+from models.member_time import MemberTimeDataclass
+from services.member_store import MemberTimeRepository
+
+SIZES = [1_000, 10_000, 100_000]
+LOOKUPS = 200
+
+
+def build_members(size: int):
+    now = datetime.now()
+    return [
+        MemberTimeDataclass(
+            name=f"member-{i}",
+            id=100_000_000_000_000_000 + i,
+            highest_role_id=1,
+            connected_at=now,
+        )
+        for i in range(size)
+    ]
+
+
+def list_is_already_in_list(members, id):
+    return id in [member.id for member in members]
+
+
+def list_get_member(members, id):
+    if not list_is_already_in_list(members, id):
+        return None, None
+    m = [member for member in members if member.id == id]
+    if len(m) == 0:
+        return None, None
+    return m[-1], members.index(m[-1])
+
+
+def main():
+    print(f"{'members':>10} {'list (ms/op)':>14} {'index (ms/op)':>14} {'speedup':>10}")
+    for size in SIZES:
+        members = build_members(size)
+        repository = MemberTimeRepository(members)
+        ids = [random.choice(members).id for _ in range(LOOKUPS)]
+
+        list_time = timeit(
+            lambda: [list_get_member(members, id) for id in ids], number=1
+        )
+        index_time = timeit(lambda: [repository.get(id) for id in ids], number=1)
+
+        print(
+            f"{size:>10} {list_time / LOOKUPS * 1000:>14.4f} "
+            f"{index_time / LOOKUPS * 1000:>14.6f} {list_time / index_time:>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Chat requests through OpenAiHandler against the local stub server, with a
+session per request, like a client without pooling, and with the shared
+pooled OpenAiClient.
+
+Run from the project root: python -m benchmarks.bench_openai_client
+"""
+from time import perf_counter
+import asyncio
+
+from aiohttp import web
+import aiohttp
+
+from modules.openai import OpenAiHandler
+from modules.openai_client import OpenAiClient
+from modules.response_cache import ResponseCache
+from modules.usage_ledger import UsageLedger
+from tests.stub_openai_server import create_app, serve
+
+REQUESTS = 400
+USERS = 32
+DELAY = 0.02
+
+
+class UnpooledClient(OpenAiClient):
+    """Opens a new session, and connection, for every request"""
+
+    async def post(self, path, payload, priority=0):
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            async with session.post(f"{self.base_url}{path}", json=payload) as response:
+                return await response.json()
+
+
+async def run(client: OpenAiClient, app: web.Application, name: str) -> None:
+    # A cache per run, the answers of the previous one are not reused
+    handler = OpenAiHandler(
+        "key", client=client, cache=ResponseCache(), usage=UsageLedger()
+    )
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(REQUESTS):
+        queue.put_nowait(i)
+    peers_before = len(app["peers"])
+
+    async def user():
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = perf_counter()
+            response = await handler.chat([{"role": "user", "content": f"hello {i}"}])
+            assert response.choices[0].message.content == f"Echo: hello {i}"
+            latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*[user() for _ in range(USERS)])
+    elapsed = perf_counter() - start
+    await client.close()
+    latencies.sort()
+    print(
+        f"{name:>10} {REQUESTS / elapsed:>10.0f} "
+        f"{latencies[len(latencies) // 2] * 1000:>10.1f} "
+        f"{latencies[int(len(latencies) * 0.99)] * 1000:>10.1f} "
+        f"{len(app['peers']) - peers_before:>12}"
+    )
+
+
+async def main():
+    app = create_app(DELAY)
+    runner, base_url = await serve(app)
+
+    print(f"{'client':>10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'connections':>12}")
+    await run(UnpooledClient("key", base_url, max_concurrency=USERS), app, "unpooled")
+    await run(OpenAiClient("key", base_url, max_concurrency=USERS), app, "pooled")
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Bursts of chat requests through OpenAiHandler against the local stub server.
+
+The first burst has many users asking the same few questions at once, sent
+each on its own and with the identical requests in flight coalesced. The
+second has background requests queued ahead of interactive ones, served in
+arrival order and with the interactive ones at a higher priority.
+
+Run from the project root: python -m benchmarks.bench_openai_limiter
+"""
+from time import perf_counter
+import asyncio
+
+from aiohttp import web
+
+from modules.openai import OpenAiHandler
+from modules.openai_client import OpenAiClient
+from modules.response_cache import ResponseCache
+from modules.usage_ledger import UsageLedger
+from tests.stub_openai_server import create_app, serve
+
+USERS = 64
+QUESTIONS = 4
+BACKGROUND = 24
+INTERACTIVE = 8
+DELAY = 0.05
+
+
+class NoFlights:
+    """Sends every request, identical or not"""
+
+    coalesced = 0
+
+    async def do(self, key, call):
+        return await call()
+
+
+async def burst(base_url: str, app: web.Application, coalesce: bool) -> None:
+    client = OpenAiClient("key", base_url, max_concurrency=8, model_concurrency=4)
+    if not coalesce:
+        client.flights = NoFlights()
+    handler = OpenAiHandler(
+        "key", client=client, cache=ResponseCache(), usage=UsageLedger()
+    )
+    requests_before = app["stats"]["requests"]
+    start = perf_counter()
+    await asyncio.gather(
+        *[
+            handler.chat([{"role": "user", "content": f"question {i % QUESTIONS}"}])
+            for i in range(USERS)
+        ]
+    )
+    elapsed = perf_counter() - start
+    await client.close()
+    upstream = app["stats"]["requests"] - requests_before
+    name = "coalesced" if coalesce else "separate"
+    print(f"{name:>12} {elapsed:>10.2f} {upstream:>10} {client.flights.coalesced:>10}")
+
+
+async def priorities(base_url: str, prioritized: bool) -> None:
+    client = OpenAiClient("key", base_url, max_concurrency=8, model_concurrency=2)
+    handler = OpenAiHandler(
+        "key", client=client, cache=ResponseCache(), usage=UsageLedger()
+    )
+
+    async def ask(i: int, priority: int) -> float:
+        start = perf_counter()
+        await handler.chat([{"role": "user", "content": f"ask {i}"}], priority=priority)
+        return perf_counter() - start
+
+    background = [
+        asyncio.create_task(ask(i, 1 if prioritized else 0)) for i in range(BACKGROUND)
+    ]
+    await asyncio.sleep(0)
+    interactive = [
+        asyncio.create_task(ask(BACKGROUND + i, 0)) for i in range(INTERACTIVE)
+    ]
+    await asyncio.gather(*background)
+    waits = await asyncio.gather(*interactive)
+    await client.close()
+    name = "priority" if prioritized else "arrival"
+    print(f"{name:>12} {sum(waits) / len(waits):>22.2f} {max(waits):>22.2f}")
+
+
+async def main():
+    app = create_app(DELAY)
+    runner, base_url = await serve(app)
+
+    print(f"{'requests':>12} {'elapsed s':>10} {'upstream':>10} {'coalesced':>10}")
+    await burst(base_url, app, coalesce=False)
+    await burst(base_url, app, coalesce=True)
+    print()
+    print(f"{'order':>12} {'interactive mean s':>22} {'interactive max s':>22}")
+    await priorities(base_url, prioritized=False)
+    await priorities(base_url, prioritized=True)
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
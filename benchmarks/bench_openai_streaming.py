@@ -0,0 +1,80 @@
+"""
+Time until the first text of an answer is visible in discord, waiting for
+the whole chat completion and with the streamed one shown by StreamingReply.
+
+The answers come from the local stub server, generating a word every 20ms,
+and the discord messages are fakes that take 100ms per send or edit.
+
+Run from the project root: python -m benchmarks.bench_openai_streaming
+"""
+from time import perf_counter
+import asyncio
+
+from modules.openai import OpenAiHandler
+from modules.openai_client import OpenAiClient
+from modules.usage_ledger import UsageLedger
+from views.streaming_reply import StreamingReply
+from tests.stub_openai_server import create_app, serve
+
+WORDS = 150
+DELAY = 0.3
+TOKEN_DELAY = 0.02
+DISCORD_LATENCY = 0.1
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", content: str) -> None:
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content: str) -> None:
+        await asyncio.sleep(DISCORD_LATENCY)
+        self.content = content
+        self.channel.calls += 1
+
+
+class FakeChannel:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.first_text_at = None
+
+    async def send(self, content: str) -> FakeMessage:
+        await asyncio.sleep(DISCORD_LATENCY)
+        self.calls += 1
+        if self.first_text_at is None:
+            self.first_text_at = perf_counter()
+        return FakeMessage(self, content)
+
+
+async def main():
+    app = create_app(DELAY, TOKEN_DELAY)
+    runner, base_url = await serve(app)
+    client = OpenAiClient("key", base_url)
+    handler = OpenAiHandler("key", client=client, usage=UsageLedger())
+    messages = [{"role": "user", "content": " ".join(["word"] * WORDS)}]
+
+    print(f"{'mode':>10} {'first text s':>14} {'complete s':>12} {'discord calls':>14}")
+
+    channel = FakeChannel()
+    start = perf_counter()
+    response = await handler.chat(messages)
+    await channel.send(response.choices[0].message.content)
+    print(
+        f"{'complete':>10} {channel.first_text_at - start:>14.2f} "
+        f"{perf_counter() - start:>12.2f} {channel.calls:>14}"
+    )
+
+    channel = FakeChannel()
+    start = perf_counter()
+    await StreamingReply(channel).consume(handler.chat_stream(messages))
+    print(
+        f"{'streamed':>10} {channel.first_text_at - start:>14.2f} "
+        f"{perf_counter() - start:>12.2f} {channel.calls:>14}"
+    )
+
+    await client.close()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
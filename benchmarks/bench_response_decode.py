@@ -0,0 +1,56 @@
+"""
+Cost of decoding chat completion payloads with many choices and reading
+what the handler uses, the text of the first choice and the usage, with
+the validated dataclasses and with the lazy views.
+
+Run from the project root: python -m benchmarks.bench_response_decode
+"""
+from time import perf_counter
+import time
+
+from domain.gpt_chat_response import gpt_chat_response_from_dict
+from domain.lazy_view import set_strict_responses
+
+RESPONSES = 2_000
+
+
+def payload(choices: int) -> dict:
+    content = "word " * 200
+    return {
+        "choices": [
+            {
+                "finish_reason": "stop",
+                "index": i,
+                "message": {"content": content, "role": "assistant"},
+            }
+            for i in range(choices)
+        ],
+        "created": int(time.time()),
+        "id": "chatcmpl-1",
+        "model": "gpt-3.5-turbo",
+        "object": "chat.completion",
+        "usage": {"completion_tokens": 200, "prompt_tokens": 20, "total_tokens": 220},
+    }
+
+
+def measure(data: dict, strict: bool) -> float:
+    set_strict_responses(strict)
+    start = perf_counter()
+    for _ in range(RESPONSES):
+        response = gpt_chat_response_from_dict(data)
+        response.choices[0].message.content
+        response.usage.prompt_tokens
+    return (perf_counter() - start) / RESPONSES * 1_000_000
+
+
+def main():
+    print(f"{'choices':>8} {'strict us':>10} {'lazy us':>10} {'speedup':>8}")
+    for choices in (1, 8, 32, 128):
+        data = payload(choices)
+        strict = measure(data, strict=True)
+        lazy = measure(data, strict=False)
+        print(f"{choices:>8} {strict:>10.1f} {lazy:>10.1f} {strict / lazy:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,18 @@
 from discord.ext.commands.errors import MissingPermissions
-from models.member_time import (
-    MemberTimeDataclass,
-    member_time_dataclass_from_dict,
-    member_time_dataclass_to_dict,
-)
-from typing import List, Optional, Tuple
+from models.member_time import MemberTimeDataclass
+from services.guild_state import GuildStates
+from services.promotions import Promotion, PromotionScheduler, swap_role
+from services.role_index import RoleRankIndex
+from services.voice_events import VoiceEventCoalescer
+from typing import Optional
 from datetime import datetime, timedelta
+from logging import DEBUG
 from utils.logger import AppLogger
-from discord.ext import commands
-from os import path
-import numpy as np
+from discord.ext import commands, tasks
+from decouple import Csv, config
+import bisect
 
 import discord
-import json
 
 
 class Observer(commands.Cog, AppLogger):
@@ -32,14 +32,34 @@ class Observer(commands.Cog, AppLogger):
     # List of roles
     # last equals to higher role
 
-    member_file = "member_times.json"
-    member_time_list: List[MemberTimeDataclass] = []
+    states: GuildStates
+    role_index: RoleRankIndex
+    promotions: PromotionScheduler
+    voice_events: VoiceEventCoalescer
 
     def __init__(self, bot: commands.Bot) -> None:
         super().__init__()
         self.bot = bot
         self.logger.info("Starting 'Observer' Cog")
-        self.member_time_list = self.read_from_json()
+        # The files of a single guild bot are adopted by its guild
+        legacy_guilds = config("MY_GUILDS", default="", cast=Csv(int))
+        self.states = GuildStates(
+            config("MEMBER_DATA_DIR", default="guilds"),
+            backend=config("MEMBER_STORAGE", default="json"),
+            flush_interval=config("MEMBER_FLUSH_INTERVAL", default=30, cast=float),
+            compact_interval=config("MEMBER_COMPACT_INTERVAL", default=300, cast=float),
+            legacy_guild_id=legacy_guilds[0] if len(legacy_guilds) == 1 else None,
+        )
+        self.role_index = RoleRankIndex()
+        self.promotions = PromotionScheduler(
+            requests_per_second=config("PROMOTION_RATE", default=1, cast=float),
+            failure_backoff=60
+            * config("PROMOTION_FAILURE_BACKOFF", default=60, cast=float),
+        )
+        self.voice_events = VoiceEventCoalescer(
+            self.apply_voice_change,
+            window=config("VOICE_EVENT_WINDOW", default=5, cast=float),
+        )
         self.NO_PERMISSION_MSG = (
             "You dont have the right permissions to use this command!"
         )
@@ -50,17 +70,20 @@ class Observer(commands.Cog, AppLogger):
         await ctx.response.defer()
         ctx.channel.typing()
 
-        if not self.member_is_already_in_list(ctx.user.id):
+        if not self.member_is_already_in_list(ctx.user):
             await ctx.followup.send(
                 "Sorry, currently you are not registered yet in my database, check again next time that you enter in a voice channel from this guild again",
                 ephemeral=True,
             )
             return None
 
-        current_member, _ = self.get_member_from_list(ctx.user.id)
+        current_member = self.get_member_from_list(ctx.user)
+        minutes = self.states.get(ctx.guild).sessions.live_minutes(
+            current_member, datetime.now()
+        )
 
         await ctx.followup.send(
-            f"According to my database you have spent a total of {current_member.total_minutes_connected / 60} hours connected to voice channels",
+            f"According to my database you have spent a total of {minutes / 60} hours connected to voice channels",
         )
 
     @my_subgroup.command(name="next_role")
@@ -70,9 +93,8 @@ class Observer(commands.Cog, AppLogger):
         ctx.channel.typing()
 
         role = self.get_member_highest_role(ctx.user)
-        role_index = ctx.guild.roles.index(role)
-        if role_index != len(ctx.guild.roles) - 1:
-            next_role = ctx.guild.roles[role_index + 1]
+        next_role = self.role_index.ladder_of(role).above(role)
+        if next_role is not None:
             await ctx.followup.send(
                 f"Hello {ctx.user.mention}, your next role is {next_role.mention}."
             )
@@ -82,16 +104,15 @@ class Observer(commands.Cog, AppLogger):
             )
             return
 
-        member, _ = self.get_member_from_list(ctx.user.id)
+        state = self.states.get(ctx.guild)
+        member = state.get(ctx.user.id)
         if (
             member is not None
             and member.expected_exponential_intervals is not None
             and len(member.expected_exponential_intervals) != 0
         ):
-            minutes_left = (
-                member.expected_exponential_intervals[0]
-                - member.total_minutes_connected
-            )
+            minutes = state.sessions.live_minutes(member, datetime.now())
+            minutes_left = member.expected_exponential_intervals[0] - minutes
             await ctx.followup.send(
                 f"You need to stay connected for another {minutes_left / 60} hours to obtain the next role",
                 ephemeral=True,
@@ -115,10 +136,9 @@ class Observer(commands.Cog, AppLogger):
         )
         try:
             ctx.response.defer()
-            current_member, i = self.get_member_from_list(member.id)
+            current_member = self.get_member_from_list(member)
             current_member.connected_at = datetime.now()
-            self.member_time_list[i] = current_member
-            self.save_to_json()
+            self.save_member(member.guild, current_member, "update")
 
             self.logger.info(
                 f"Updated and saved user connected time for user {member.name}"
@@ -149,7 +169,8 @@ class Observer(commands.Cog, AppLogger):
         await ctx.response.defer()
         ctx.channel.typing()
 
-        current_member, _ = self.get_member_from_list(member.id)
+        state = self.states.get(member.guild)
+        current_member = state.get(member.id)
         if current_member is None:
             await ctx.followup.send(
                 f"User {member.mention} is not on the tracking list yet"
@@ -157,10 +178,11 @@ class Observer(commands.Cog, AppLogger):
             return
 
         current_role = self.get_member_highest_role(member)
-        current_role_index = ctx.guild.roles.index(current_role)
+        ladder = self.role_index.ladder_of(current_role)
+        current_role_index = ladder.rank(current_role)
 
         async def check_role_time(chosen_role: discord.Role):
-            wanted_role_index = ctx.guild.roles.index(chosen_role)
+            wanted_role_index = ladder.rank(chosen_role)
             difference = wanted_role_index - current_role_index
             if difference < 0:
                 await ctx.followup.send(
@@ -170,9 +192,8 @@ class Observer(commands.Cog, AppLogger):
             if len(current_member.expected_exponential_intervals) > difference:
                 times = current_member.expected_exponential_intervals[:difference]
                 self.logger.info(f"User {times=}")
-                days_left = (
-                    (times[-1] - current_member.total_minutes_connected) / 60
-                ) / 24
+                minutes = state.sessions.live_minutes(current_member, datetime.now())
+                days_left = ((times[-1] - minutes) / 60) / 24
                 await ctx.followup.send(
                     f"The expected time for the user {member.mention} to achive {chosen_role.mention} is: {days_left} days",
                 )
@@ -184,12 +205,12 @@ class Observer(commands.Cog, AppLogger):
         if role is not None:
             await check_role_time(role)
         else:
-            if current_role_index == len(ctx.guild.roles) - 1:
+            if ladder.is_highest(current_role):
                 await ctx.followup.send(
                     f"User {member.mention} already have the highest role possible"
                 )
                 return
-            role = ctx.guild.roles[current_role_index + 1]
+            role = ladder.above(current_role)
             await check_role_time(role)
 
     @control_subgroup.command(name="winning")
@@ -200,10 +221,14 @@ class Observer(commands.Cog, AppLogger):
         )
         await ctx.response.defer()
         ctx.channel.typing()
-        self.member_time_list.sort(
-            key=lambda x: x.total_minutes_connected, reverse=True
-        )
-        current_member = self.member_time_list[0]
+        state = self.states.get(ctx.guild)
+        top = state.leaderboard.top()
+        if len(top) == 0:
+            await ctx.followup.send("Nobody is on the tracking list yet")
+            return
+        # Ranked by the checkpointed totals, shown with the live one
+        current_member = state.get(top[0][1])
+        minutes = state.sessions.live_minutes(current_member, datetime.now())
         member: discord.Member = ctx.guild.get_member(current_member.id)
         if member is None:
             await ctx.followup.send(
@@ -211,8 +236,48 @@ class Observer(commands.Cog, AppLogger):
             )
         else:
             await ctx.followup.send(
-                f"The member with the highest time until now is {member.mention} with {current_member.total_minutes_connected/60/24} days connected"
+                f"The member with the highest time until now is {member.mention} with {minutes/60/24} days connected"
+            )
+
+    @control_subgroup.command(name="leaderboard")
+    async def get_leaderboard(
+        self,
+        ctx: discord.ApplicationContext,
+        page: Optional[int] = 1,
+        member: Optional[discord.Member] = None,
+    ):
+        """List the members with the highest time, or the rank of a member"""
+        await ctx.response.defer()
+        ctx.channel.typing()
+        leaderboard = self.states.get(ctx.guild).leaderboard
+        page = min(max(page or 1, 1), leaderboard.pages())
+        lines = []
+        for rank, id, minutes in leaderboard.page(page):
+            guild_member = ctx.guild.get_member(id)
+            name = guild_member.mention if guild_member is not None else f"`{id}`"
+            lines.append(f"**#{rank}** {name} - {minutes / 60:.1f} hours")
+        if len(lines) == 0:
+            lines.append("Nobody is on the tracking list yet")
+        lines.append(f"Page {page}/{leaderboard.pages()}")
+        if member is not None:
+            rank = leaderboard.rank(member.id)
+            lines.append(
+                f"{member.mention} is at the rank #{rank} of {len(leaderboard)}"
+                if rank is not None
+                else f"User {member.mention} is not on the tracking list yet"
             )
+        await ctx.followup.send("\n".join(lines))
+
+    @control_subgroup.command(name="voice_events")
+    async def get_voice_event_stats(self, ctx: discord.ApplicationContext):
+        """How many voice connection events were received and applied"""
+        await ctx.response.defer()
+        events = self.voice_events
+        await ctx.followup.send(
+            f"Received {events.received} voice connection event(s), applied {events.applied}, "
+            f"{events.coalesced} cancelled out by reconnections and {events.pending} waiting",
+            ephemeral=True,
+        )
 
     @control_subgroup.command(name="recalculate")
     @commands.has_guild_permissions(administrator=True)
@@ -229,7 +294,7 @@ class Observer(commands.Cog, AppLogger):
             await ctx.response.defer()
             ctx.channel.typing()
 
-            current_member, i = self.get_member_from_list(member.id)
+            current_member = self.get_member_from_list(member)
             if current_member is None:
                 await ctx.followup.send(
                     f"User {member.mention} is not on the tracking list yet"
@@ -239,11 +304,10 @@ class Observer(commands.Cog, AppLogger):
             current_member.expected_exponential_intervals = (
                 self.calculate_exponential_interval(member)
             )
-            self.member_time_list[i] = current_member
             await ctx.followup.send(
                 f"Recalculated time intervals for the user {member.mention}. The new intervals are {current_member.expected_exponential_intervals} minutes"
             )
-            self.save_to_json()
+            self.save_member(member.guild, current_member, "recalculate")
         except MissingPermissions:
             self.logger.error(
                 f"User {ctx.user.name} don't have the correct permissions to use this command"
@@ -258,6 +322,47 @@ class Observer(commands.Cog, AppLogger):
         except Exception as e:
             self.logger.error(f"Error ocurred {e}")
 
+    @control_subgroup.command(name="recalculate_all")
+    @commands.has_guild_permissions(administrator=True)
+    async def recalculate_all_time_intervals(
+        self,
+        ctx: discord.ApplicationContext,
+    ) -> None:
+        """Recalculate the time intervals of every tracked member of the guild"""
+        self.logger.info(
+            f"User {ctx.user.name} requested a recalculation of the intervals for every member"
+        )
+        try:
+            await ctx.response.defer()
+            ctx.channel.typing()
+
+            state = self.states.get(ctx.guild)
+            tracked = [
+                (current_member, member)
+                for current_member in state.members
+                if (member := ctx.guild.get_member(current_member.id)) is not None
+            ]
+            ladder = self.role_index.ladder(ctx.guild)
+            intervals = ladder.bulk_intervals(
+                [ladder.rank(self.get_member_highest_role(m)) for _, m in tracked],
+            )
+            for (current_member, _), member_intervals in zip(tracked, intervals):
+                current_member.expected_exponential_intervals = member_intervals
+                state.save(current_member, "recalculate")
+            await ctx.followup.send(
+                f"Recalculated time intervals for {len(tracked)} member(s)"
+            )
+        except MissingPermissions:
+            self.logger.error(
+                f"User {ctx.user.name} don't have the correct permissions to use this command"
+            )
+            if not ctx.response.is_done():
+                ctx.response.send_message(self.NO_PERMISSION_MSG, ephemeral=True)
+            else:
+                ctx.followup.send(self.NO_PERMISSION_MSG, ephemeral=True)
+        except Exception as e:
+            self.logger.error(f"Error ocurred {e}")
+
     @control_subgroup.command(name="promote")
     @commands.has_guild_permissions(administrator=True)
     async def promote_member(
@@ -279,7 +384,7 @@ class Observer(commands.Cog, AppLogger):
                 )
                 return
 
-            m, _ = self.get_member_from_list(member.id)
+            m = self.get_member_from_list(member)
             if m is None:
                 await ctx.followup.send(
                     f"Current {member.mention} is not in the track list, is not possible to interact with his rank",
@@ -291,26 +396,24 @@ class Observer(commands.Cog, AppLogger):
                 return
 
             role = self.get_member_highest_role(member)
-            role_index = ctx.guild.roles.index(role)
-            if len(ctx.guild.roles) - 1 == role_index:
+            ladder = self.role_index.ladder_of(role)
+            if ladder.is_highest(role):
                 await ctx.followup.send(
                     f"Current {member.mention} is already at the highest possible role.",
                     ephemeral=True,
                 )
             else:
-                next_role = ctx.guild.roles[role_index + 1]
-                await member.remove_roles(role)
-                await member.add_roles(next_role)
+                next_role = ladder.above(role)
+                await swap_role(member, role, next_role)
                 await ctx.followup.send(
                     f"{member.mention} received a promotion to the role of {next_role.mention}"
                 )
-                current_member, i = self.get_member_from_list(member.id)
+                current_member = self.get_member_from_list(member)
                 current_member.expected_exponential_intervals = (
                     self.calculate_exponential_interval(member)
                 )
                 current_member.expected_exponential_intervals.pop(0)
-                self.member_time_list[i] = current_member
-                self.save_to_json()
+                self.save_member(member.guild, current_member, "promote")
         except MissingPermissions:
             self.logger.error(
                 f"User {ctx.user.name} don't have the correct permissions to use this command"
@@ -345,7 +448,7 @@ class Observer(commands.Cog, AppLogger):
                 )
                 return
 
-            m, _ = self.get_member_from_list(member.id)
+            m = self.get_member_from_list(member)
             if m is None:
                 await ctx.followup.send(
                     f"Current {member.mention} is not in the track list, is not possible to interact with his rank",
@@ -357,26 +460,24 @@ class Observer(commands.Cog, AppLogger):
                 return
 
             role = self.get_member_highest_role(member)
-            role_index = ctx.guild.roles.index(role)
-            if role_index - 1 > 0:
+            ladder = self.role_index.ladder_of(role)
+            if ladder.rank(role) - 1 > 0:
                 await ctx.followup.send(
                     f"Current {member.mention} is already at the lowest possible role.",
                     ephemeral=True,
                 )
             else:
-                previous_role = ctx.guild.roles[role_index - 1]
-                await member.remove_roles(role)
-                await member.add_roles(previous_role)
+                previous_role = ladder.below(role)
+                await swap_role(member, role, previous_role)
                 await ctx.followup.send(
                     f"{member.mention} received a demotion to the role of {previous_role.mention}"
                 )
-                current_member, i = self.get_member_from_list(member.id)
+                current_member = self.get_member_from_list(member)
                 current_member.expected_exponential_intervals = (
                     self.calculate_exponential_interval(member)
                 )
                 current_member.expected_exponential_intervals.pop(0)
-                self.member_time_list[i] = current_member
-                self.save_to_json()
+                self.save_member(member.guild, current_member, "demote")
         except MissingPermissions:
             self.logger.error(
                 f"User {ctx.user.name} don't have the correct permissions to use this command"
@@ -398,33 +499,151 @@ class Observer(commands.Cog, AppLogger):
         after: discord.VoiceState,
     ):
         """Checks if the user joined the channels"""
-        self.logger.info(
-            f"Voice state update event received: {member.name} - {member.id}"
+        self.log_event(
+            "voice_state",
+            "Voice state update event received: %s - %s",
+            member.name,
+            member.id,
+            guild_id=member.guild.id,
+            before_channel_id=before.channel and before.channel.id,
+            after_channel_id=after.channel and after.channel.id,
         )
         if member.bot:
             return None
         if before.channel is None and after.channel is not None:
             # User connected to voice channel
-            await self.user_joined_voice_channel(member)
+            await self.voice_events.push(member, connected=True)
         elif before.channel is not None and after.channel is None:
             # User disconnected from voice channel
-            await self.user_left_voice_channel(member)
+            await self.voice_events.push(member, connected=False)
+        else:
+            self.log_event(
+                "voice_state",
+                "User %s changed status, but still connected",
+                member.name,
+                level=DEBUG,
+            )
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        await self.seed_sessions()
+        if not self.session_checkpoint.is_running():
+            self.session_checkpoint.start()
+        if not self.promotion_sweep.is_running():
+            self.promotion_sweep.start()
+
+    async def seed_sessions(self) -> None:
+        """Match the active sessions with who is in the voice channels now"""
+        # Only the guilds of the shards of this process are listed
+        for guild in self.bot.guilds:
+            await self.seed_guild_sessions(guild)
+        self.logger.info(
+            f"{sum(len(state.sessions) for state in self.states)} active voice session(s) on ready in {len(self.states)} guild(s)"
+        )
+
+    async def seed_guild_sessions(self, guild: discord.Guild) -> None:
+        sessions = self.states.get(guild).sessions
+        connected = {
+            member.id: member
+            for channel in guild.voice_channels
+            for member in channel.members
+            if not member.bot
+        }
+        # Left while the bot was offline, their time is only counted until
+        # the last checkpoint
+        for session in sessions:
+            if session.member_id not in connected:
+                sessions.discard(session.member_id)
+        for member in connected.values():
+            if member.id not in sessions:
+                await self.user_joined_voice_channel(member)
+
+    @tasks.loop(minutes=config("SESSION_CHECKPOINT_INTERVAL", default=5, cast=float))
+    async def session_checkpoint(self) -> None:
+        """Add the time of the open sessions, a crash only loses one interval"""
+        now = datetime.now()
+        for state in self.states:
+            for session in state.sessions:
+                current_member = state.get(session.member_id)
+                if current_member is None:
+                    continue
+                current_member.total_minutes_connected += state.sessions.checkpoint(
+                    session.member_id, now
+                )
+                state.save(current_member, "checkpoint")
+
+    @tasks.loop(minutes=config("PROMOTION_SWEEP_INTERVAL", default=15, cast=float))
+    async def promotion_sweep(self) -> None:
+        """Promote the members that completed an interval without reconnecting"""
+        now = datetime.now()
+        for guild in self.bot.guilds:
+            state = self.states.get(guild)
+            for channel in guild.voice_channels:
+                for member in channel.members:
+                    if member.bot or self.promotions.is_held(guild.id, member.id):
+                        continue
+                    current_member = state.get(member.id)
+                    if current_member is None:
+                        continue
+                    minutes = state.sessions.live_minutes(current_member, now)
+                    if self.check_promotion(member, current_member, minutes):
+                        state.save(current_member, "promotion")
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        self.role_index.invalidate(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.role_index.invalidate(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.role_index.invalidate(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        self.role_index.invalidate(after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        # Roles may have changed while the guild was unavailable
+        self.role_index.invalidate(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        await self.seed_guild_sessions(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.role_index.invalidate(guild.id)
+        await self.states.unload(guild.id)
+
+    async def apply_voice_change(
+        self, member: discord.Member, connected: bool, at: datetime
+    ) -> None:
+        if connected:
+            await self.user_joined_voice_channel(member, at)
         else:
-            self.logger.debug(f"User {member.name} changed status, but still connected")
+            await self.user_left_voice_channel(member, at)
 
-    async def user_joined_voice_channel(self, member: discord.Member) -> None:
+    async def user_joined_voice_channel(
+        self, member: discord.Member, at: Optional[datetime] = None
+    ) -> None:
         self.logger.info(
             f"User {member.name} joined the voice channel, saving the connection time"
         )
-        if not self.member_is_already_in_list(member.id):
+        at = at or datetime.now()
+        state = self.states.get(member.guild)
+        if not state.members.contains(member.id):
             self.logger.info("User not recorded yet, creating entry")
-            self.member_time_list.append(
+            current_member = state.members.add(
                 MemberTimeDataclass(
                     id=member.id,
                     name=member.name,
                     highest_role_id=self.get_member_highest_role(member).id,
-                    connected_at=datetime.now(),
-                    last_connected_at=datetime.now(),
+                    connected_at=at,
+                    last_connected_at=at,
                     expected_exponential_intervals=self.calculate_exponential_interval(
                         member
                     ),
@@ -432,12 +651,17 @@ class Observer(commands.Cog, AppLogger):
             )
         else:
             self.logger.info("User found in the record, updating entry")
-            current_member, i = self.get_member_from_list(member.id)
+            current_member = state.get(member.id)
             self.logger.info(
                 f"Last connection was on {current_member.last_connected_at}"
             )
             current_member.last_connected_at = current_member.connected_at
-            current_member.connected_at = datetime.now()
+            current_member.connected_at = at
+            if member.id in state.sessions:
+                # Joined again without a leave event, keep the time until now
+                current_member.total_minutes_connected += state.sessions.close(
+                    member.id, current_member.connected_at
+                )
 
             highest_role = self.get_member_highest_role(member)
             current_member.highest_role_id = highest_role.id
@@ -447,65 +671,95 @@ class Observer(commands.Cog, AppLogger):
                     self.calculate_exponential_interval(member)
                 )
 
-            if len(current_member.expected_exponential_intervals) == 0:
-                return None
-            elif (
-                current_member.total_minutes_connected
-                > current_member.expected_exponential_intervals[0]
+            if not self.check_promotion(
+                member, current_member, current_member.total_minutes_connected
             ):
-                intervals_completed = [
-                    interval
-                    for interval in current_member.expected_exponential_intervals
-                    if current_member.total_minutes_connected > interval
-                ]
-                self.logger.info(
-                    f"Current user {member.name} has meet {len(intervals_completed)}({intervals_completed=}) required interval(s), upgrading his roles"
-                )
-                # Remove current intervals already complete
-                for i in range(len(intervals_completed)):
-                    current_member.expected_exponential_intervals.pop(0)
-
-                role_index = member.guild.roles.index(highest_role)
-                current_role = member.guild.roles[role_index]
-                role_above = member.guild.roles[role_index:][len(intervals_completed)]
-
-                await member.remove_roles(
-                    current_role,
-                    reason="Spent the required amount, promotion given",
-                )
-                await member.add_roles(
-                    role_above,
-                    reason="Spent the required amount, promotion given",
-                )
-
-                if member.can_send():
-                    await member.send(
-                        f"Hello, you are now elegible to the role of `{role_above.name}`. Congratulations!"
-                    )
-            else:
                 self.logger.info(
                     f"Current user {member.name}({member.id}) has not meet the required time yet to unlock the next role"
                 )
-            self.member_time_list[i] = current_member
 
-        self.save_to_json()
+        state.sessions.start(member.id, current_member.connected_at)
+        state.save(current_member, "join")
 
-    async def user_left_voice_channel(self, member: discord.Member) -> None:
+    async def user_left_voice_channel(
+        self, member: discord.Member, at: Optional[datetime] = None
+    ) -> None:
         self.logger.info(
             f"User {member.name} left the voice channel, saving the disconnection time"
         )
-        current_member, i = self.get_member_from_list(member.id)
-        if current_member is None or i is None:
+        state = self.states.get(member.guild)
+        current_member = state.get(member.id)
+        if current_member is None:
             return None
 
-        current_member.disconnected_at = datetime.now()
+        current_member.disconnected_at = at or datetime.now()
         current_member.update_last_connected_by()
-        current_member.update_total_minutes()
-        self.member_time_list[i] = current_member
-        self.save_to_json()
+        if member.id not in state.sessions:
+            self.logger.warning(
+                f"User {member.name} left without an active session, no time added"
+            )
+        current_member.total_minutes_connected += state.sessions.close(
+            member.id, current_member.disconnected_at
+        )
+        state.save(current_member, "leave")
 
-    def member_is_already_in_list(self, id: int) -> bool:
-        return id in [member.id for member in self.member_time_list]
+    def save_member(
+        self, guild: discord.Guild, member: MemberTimeDataclass, event: str
+    ) -> None:
+        self.states.get(guild).save(member, event)
+
+    def check_promotion(
+        self,
+        member: discord.Member,
+        current_member: MemberTimeDataclass,
+        minutes: float,
+    ) -> bool:
+        """
+        Schedule the promotion of a member that completed intervals, if any.
+        The completed intervals are only removed once the role was swapped,
+        so a promotion that was not applied is scheduled again by the sweep.
+        """
+        intervals = current_member.expected_exponential_intervals
+        if not intervals or minutes <= intervals[0]:
+            return False
+        # Intervals are ascending, count the ones below the connected minutes
+        completed = bisect.bisect_left(intervals, minutes)
+        self.logger.info(
+            f"Current user {member.name} has meet {completed}({intervals[:completed]=}) required interval(s), upgrading his roles"
+        )
+
+        def consume_intervals() -> None:
+            # The intervals may have been recalculated while it was queued
+            intervals = current_member.expected_exponential_intervals
+            if intervals:
+                del intervals[: bisect.bisect_left(intervals, minutes)]
+            self.save_member(member.guild, current_member, "promotion")
+
+        highest_role = self.get_member_highest_role(member)
+        role_above = self.role_index.ladder_of(highest_role).above(
+            highest_role, completed
+        )
+        if role_above is None:
+            self.logger.warning(
+                f"Current user {member.name} has no role {completed} position(s) above {highest_role.name}"
+            )
+            # Nothing to swap, the intervals are consumed right away
+            del intervals[:completed]
+            return True
+        self.promotions.schedule(
+            Promotion(
+                guild=member.guild,
+                member_id=member.id,
+                from_role_id=highest_role.id,
+                to_role_id=role_above.id,
+                reason="Spent the required amount, promotion given",
+                on_applied=consume_intervals,
+            )
+        )
+        return True
+
+    def member_is_already_in_list(self, member: discord.Member) -> bool:
+        return self.states.get(member.guild).members.contains(member.id)
 
     def get_member_highest_role(self, member: discord.Member):
         highest_role = member.roles[-1]
@@ -515,56 +769,22 @@ class Observer(commands.Cog, AppLogger):
 
     def get_member_from_list(
         self,
-        id: int,
-    ) -> Tuple[MemberTimeDataclass, int] | Tuple[None, None]:
-        if not self.member_is_already_in_list(id):
-            return None, None
-
-        m = [member_obs for member_obs in self.member_time_list if member_obs.id == id]
-        if len(m) == 0:
-            return None, None
-
-        current_member = m[-1]
-        m.clear()
-        del m
-
-        return current_member, self.member_time_list.index(current_member)
+        member: discord.Member,
+    ) -> Optional[MemberTimeDataclass]:
+        return self.states.get(member.guild).get(member.id)
 
     def calculate_exponential_interval(self, member: discord.Member):
         self.logger.info(f"Calculating exponential interval for {member.display_name}")
-        starting_minutes_required = 200 * 60  # Hours * min = Total Min
-        # 2 years * days * hours * minutes = Total in minutes
-        total_minutes_to_max_role = 2 * 365 * 24 * 60
-
-        roles = member.guild.roles
-        # Split roles based on the current member role
+        # Intervals only depend on how many roles are above the current one
         current_role = self.get_member_highest_role(member)
-        index = roles.index(current_role)
-        roles = roles[index:]
-
-        intervals = np.geomspace(
-            starting_minutes_required,
-            total_minutes_to_max_role,
-            len(roles),
-        )
-        intervals_list = intervals.tolist()
-
-        return intervals_list
-
-    def save_to_json(self):
-        self.logger.debug(f"[{self.__class__.__name__}] Opening json file to save")
-        with open(self.member_file, "w") as f:
-            self.logger.debug(f"[{self.__class__.__name__}] Json Record file open")
-            json.dump(
-                member_time_dataclass_to_dict(self.member_time_list),
-                fp=f,
-                indent=4,
-            )
-        self.logger.debug(f"[{self.__class__.__name__}] Operation finished. File saved")
-
-    def read_from_json(self):
-        if not path.exists(self.member_file):
-            return []
-        with open(self.member_file, "r") as f:
-            parsed_data = json.load(f)
-            return member_time_dataclass_from_dict(parsed_data)
+        ladder = self.role_index.ladder_of(current_role)
+        return ladder.intervals(ladder.rank(current_role))
+
+    async def shutdown(self) -> None:
+        """Flush every pending change before the bot closes"""
+        self.promotion_sweep.cancel()
+        self.session_checkpoint.cancel()
+        await self.voice_events.flush()
+        await self.session_checkpoint()
+        await self.promotions.close()
+        await self.states.close()
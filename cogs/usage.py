@@ -0,0 +1,142 @@
+from typing import Any, Dict, List, Optional
+
+from decouple import config
+from discord.ext import commands, tasks
+import discord
+
+from modules.openai_client import OpenAiClient
+from modules.response_cache import ResponseCache
+from modules.usage_ledger import UsageLedger
+from utils.async_tools import pool_metrics
+from utils.logger import AppLogger
+
+
+class Usage(commands.Cog, AppLogger):
+    group = discord.SlashCommandGroup(
+        name="usage",
+        description="Series of commands related to the usage of the OpenAI API",
+    )
+
+    ledger: UsageLedger
+
+    def __init__(self, bot: commands.Bot) -> None:
+        super().__init__()
+        self.bot = bot
+        self.logger.info("Starting 'Usage' Cog")
+        self.ledger = UsageLedger.shared()
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        if not self.flush_usage.is_running():
+            self.flush_usage.start()
+
+    @tasks.loop(seconds=config("OPEN_AI_USAGE_FLUSH_INTERVAL", default=60, cast=float))
+    async def flush_usage(self) -> None:
+        """Store the requests of the ledger in a single batch"""
+        await self.ledger.flush()
+        self.log_event("runtime_metrics", "Runtime metrics", **self.runtime_metrics())
+
+    @group.command(name="report")
+    @commands.has_guild_permissions(administrator=True)
+    async def report(
+        self,
+        ctx: discord.ApplicationContext,
+        member: Optional[discord.Member] = None,
+    ) -> None:
+        """Tokens used in the budget window, latencies and cache savings"""
+        await ctx.response.defer(ephemeral=True)
+        ledger = self.ledger
+        hours = ledger.window / 3600
+        lines: List[str] = [
+            f"**Last {hours:g} hours**",
+            self.spent_line(
+                "This guild",
+                ledger.tokens("guild", ctx.guild.id),
+                ledger.requests("guild", ctx.guild.id),
+                ledger.guild_budget,
+            ),
+        ]
+        if member is not None:
+            lines.append(
+                self.spent_line(
+                    member.mention,
+                    ledger.tokens("user", member.id),
+                    ledger.requests("user", member.id),
+                    ledger.user_budget,
+                )
+            )
+        for model in ledger.models():
+            latencies = ledger.latency_percentiles(model)
+            lines.append(
+                f"`{model}`: {ledger.tokens('model', model)} tokens, "
+                f"latency p50 {latencies[50]:.2f}s p95 {latencies[95]:.2f}s "
+                f"p99 {latencies[99]:.2f}s"
+            )
+        cache = ResponseCache.shared()
+        lines.append(
+            f"Cache: {cache.hits} hit(s), {cache.hit_ratio:.0%} of the lookups, "
+            f"{cache.saved_tokens} tokens saved"
+        )
+        lines.append(
+            f"Over budget: {ledger.rejected} rejected, {ledger.downgraded} downgraded"
+        )
+        lines.extend(self.runtime_lines(self.runtime_metrics()))
+        await ctx.followup.send("\n".join(lines), ephemeral=True)
+
+    def runtime_metrics(self) -> Dict[str, Any]:
+        """Queues of the bot, also logged on every flush"""
+        openai: Dict[str, Any] = {"models": {}, "retries": 0, "coalesced": 0}
+        for client in OpenAiClient.shared_clients():
+            metrics = client.queue_metrics()
+            openai["models"].update(metrics["models"])
+            openai["retries"] += metrics["retries"]
+            openai["coalesced"] += metrics["coalesced"]
+        pools = {
+            name: {
+                "in_flight": metrics.in_flight,
+                "queued": queue_depth,
+                "mean_wait": metrics.mean_wait,
+                "max_wait": metrics.max_wait,
+                "timed_out": metrics.timed_out,
+                "failed": metrics.failed,
+            }
+            for name, (metrics, queue_depth) in pool_metrics().items()
+        }
+        return {
+            "openai": openai,
+            "pools": pools,
+            "dropped_log_records": self.dropped_records,
+        }
+
+    @staticmethod
+    def runtime_lines(metrics: Dict[str, Any]) -> List[str]:
+        openai = metrics["openai"]
+        lines = ["**Queues**"]
+        for model, queue in openai["models"].items():
+            lines.append(
+                f"`{model}`: {queue['waiting']} waiting, {queue['acquired']} sent, "
+                f"wait mean {queue['mean_wait']:.2f}s max {queue['max_wait']:.2f}s"
+            )
+        lines.append(
+            f"OpenAI: {openai['retries']} retried, {openai['coalesced']} coalesced"
+        )
+        for name, pool in metrics["pools"].items():
+            lines.append(
+                f"Pool `{name}`: {pool['in_flight']} running, {pool['queued']} queued, "
+                f"wait mean {pool['mean_wait']:.2f}s max {pool['max_wait']:.2f}s, "
+                f"{pool['timed_out']} timed out, {pool['failed']} failed"
+            )
+        lines.append(f"Log records dropped: {metrics['dropped_log_records']}")
+        return lines
+
+    @staticmethod
+    def spent_line(name: str, tokens: int, requests: int, budget: int) -> str:
+        line = f"{name}: {tokens} tokens in {requests} request(s)"
+        if budget > 0:
+            line += f", {tokens / budget:.0%} of the budget of {budget}"
+        return line
+
+    async def shutdown(self) -> None:
+        """Store the pending requests before the bot closes"""
+        self.flush_usage.cancel()
+        await self.ledger.flush()
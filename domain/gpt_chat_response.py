@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 from typing import Any, List, TypeVar, Type, cast, Callable
 
+from domain.lazy_view import LazyView, field, list_field, strict_responses, view_field
+
 
 T = TypeVar("T")
 
@@ -120,9 +122,45 @@ class GPTChatResponse:
         return result
 
 
+class MessageView(LazyView):
+    __slots__ = ()
+    content = field("content")
+    role = field("role")
+
+
+class ChoiceView(LazyView):
+    __slots__ = ()
+    finish_reason = field("finish_reason")
+    index = field("index")
+    message = view_field("message", MessageView)
+
+
+class UsageView(LazyView):
+    __slots__ = ()
+    completion_tokens = field("completion_tokens")
+    prompt_tokens = field("prompt_tokens")
+    total_tokens = field("total_tokens")
+
+
+class GPTChatResponseView(LazyView):
+    __slots__ = ()
+    choices = list_field("choices", ChoiceView)
+    created = field("created")
+    id = field("id")
+    model = field("model")
+    object = field("object")
+    usage = view_field("usage", UsageView)
+
+
 def gpt_chat_response_from_dict(s: Any) -> GPTChatResponse:
-    return GPTChatResponse.from_dict(s)
+    """Lazy view of the response, or the validated dataclass when strict"""
+    if strict_responses():
+        return GPTChatResponse.from_dict(s)
+    assert isinstance(s, dict)
+    return cast(GPTChatResponse, GPTChatResponseView(s))
 
 
 def gpt_chat_response_to_dict(x: GPTChatResponse) -> Any:
+    if isinstance(x, GPTChatResponseView):
+        return x.to_dict()
     return to_class(GPTChatResponse, x)
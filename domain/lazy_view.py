@@ -0,0 +1,79 @@
+from typing import Any, Callable, Dict, Iterator, List, Sequence, TypeVar
+import copy
+
+from decouple import config
+
+T = TypeVar("T")
+
+# Decode the responses into the validated dataclasses instead of the views
+_strict = config("OPEN_AI_STRICT_RESPONSES", default=False, cast=bool)
+
+
+def set_strict_responses(enabled: bool) -> None:
+    """Validate every field of the responses as they are decoded, for tests"""
+    global _strict
+    _strict = enabled
+
+
+def strict_responses() -> bool:
+    return _strict
+
+
+class LazyView:
+    """
+    Read only view of a json payload, with the same attributes as its
+    dataclass. Fields are read from the payload when accessed, and nothing
+    is validated.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self._data = data
+
+    def to_dict(self) -> dict:
+        # The payload may be shared, like with the response cache
+        return copy.deepcopy(self._data)
+
+    def __eq__(self, other: object) -> bool:
+        return type(other) is type(self) and other._data == self._data
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._data!r})"
+
+
+class LazyList(Sequence[T]):
+    """List of payloads wrapped by a view when an item is accessed"""
+
+    __slots__ = ("_items", "_view")
+
+    def __init__(self, items: List[Any], view: Callable[[Any], T]) -> None:
+        self._items = items
+        self._view = view
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self._view(item) for item in self._items[index]]
+        return self._view(self._items[index])
+
+    def __iter__(self) -> Iterator[T]:
+        return map(self._view, self._items)
+
+
+def field(name: str) -> property:
+    return property(lambda self: self._data.get(name))
+
+
+def view_field(name: str, view: Callable[[Any], T]) -> property:
+    def get(self: LazyView) -> Any:
+        value = self._data.get(name)
+        return None if value is None else view(value)
+
+    return property(get)
+
+
+def list_field(name: str, view: Callable[[Any], T]) -> property:
+    return property(lambda self: LazyList(self._data.get(name) or [], view))
@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 from typing import Any, List, TypeVar, Callable, Type, cast
 
+from domain.lazy_view import LazyView, field, list_field, strict_responses, view_field
+
 
 T = TypeVar("T")
 
@@ -109,9 +111,40 @@ class Response:
         return result
 
 
+class ChoiceView(LazyView):
+    __slots__ = ()
+    finish_reason = field("finish_reason")
+    index = field("index")
+    logprobs = field("logprobs")
+    text = field("text")
+
+
+class UsageView(LazyView):
+    __slots__ = ()
+    completion_tokens = field("completion_tokens")
+    prompt_tokens = field("prompt_tokens")
+    total_tokens = field("total_tokens")
+
+
+class ResponseView(LazyView):
+    __slots__ = ()
+    choices = list_field("choices", ChoiceView)
+    created = field("created")
+    id = field("id")
+    model = field("model")
+    object = field("object")
+    usage = view_field("usage", UsageView)
+
+
 def response_from_dict(s: Any) -> Response:
-    return Response.from_dict(s)
+    """Lazy view of the response, or the validated dataclass when strict"""
+    if strict_responses():
+        return Response.from_dict(s)
+    assert isinstance(s, dict)
+    return cast(Response, ResponseView(s))
 
 
 def response_to_dict(x: Response) -> Any:
+    if isinstance(x, ResponseView):
+        return x.to_dict()
     return to_class(Response, x)
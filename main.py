@@ -2,12 +2,18 @@
 
 from logging import Logger, getLogger, handlers, Formatter
 from discord import Intents
-from discord.bot import Bot
+from discord.bot import AutoShardedBot
 import sentry_sdk
-from decouple import config
+from decouple import Csv, config
 
 from cogs.observer import Observer
+from cogs.usage import Usage
+from modules.openai_client import OpenAiClient
+from modules.response_cache import ResponseCache
+from modules.usage_ledger import UsageLedger
+from utils.async_tools import shutdown_pools
 from utils.logger import AppLogger
+from utils.settings import Settings
 from EVA import Eva
 
 appLogger = AppLogger()
@@ -18,7 +24,9 @@ logger = appLogger.logger
 logger.debug("Loading configs")
 
 TOKEN = config("DISCORD_TOKEN")
-GUILDS = config("MY_GUILDS")
+GUILDS = config("MY_GUILDS", default="", cast=Csv(int))
+SHARD_COUNT = config("SHARD_COUNT", default=None, cast=lambda x: int(x) if x else None)
+SHARD_IDS = config("SHARD_IDS", default="", cast=Csv(int))
 OPEN_AI = config("OPEN_AI")
 SENTRY_DSN = config("SENTRY_DSN")
 logger.debug("Configs loaded")
@@ -40,9 +48,32 @@ intents.dm_messages = True
 intents.members = True
 
 
-eva = Bot(
+class EvaBot(AutoShardedBot):
+    async def start(self, *args, **kwargs) -> None:
+        # Reload the settings on SIGHUP and file changes while running
+        Settings.shared().start()
+        await super().start(*args, **kwargs)
+
+    async def close(self) -> None:
+        # Give the cogs a chance to persist pending state before disconnecting
+        for cog in list(self.cogs.values()):
+            shutdown = getattr(cog, "shutdown", None)
+            if shutdown is not None:
+                await shutdown()
+        Settings.shared().stop()
+        await OpenAiClient.close_shared()
+        ResponseCache.close_shared()
+        UsageLedger.close_shared()
+        shutdown_pools(wait=False)
+        await super().close()
+
+
+eva = EvaBot(
     intents=intents,
-    debug_guilds=[GUILDS],
+    # Without guilds the commands are registered globally
+    debug_guilds=GUILDS or None,
+    shard_count=SHARD_COUNT,
+    shard_ids=SHARD_IDS or None,
     auto_sync_commands=True,
 )
 
@@ -59,6 +90,7 @@ eva.add_cog(Eva(eva))
 # Aditional Cogs
 COGS = [
     Observer(eva),
+    Usage(eva),
 ]
 for cog in COGS:
     logger.debug(f"Adding Cog {cog.description} to the Bot")
@@ -19,7 +19,20 @@ def from_float(x: Any) -> float:
 
 
 def from_datetime(x: Any) -> datetime:
-    return dateutil.parser.parse(x)
+    # The stored timestamps are written by isoformat(), dateutil is only
+    # needed for files edited by hand
+    try:
+        return datetime.fromisoformat(x)
+    except (TypeError, ValueError):
+        return dateutil.parser.parse(x)
+
+
+def from_optional_datetime(x: Any) -> Optional[datetime]:
+    return None if x is None else from_datetime(x)
+
+
+def from_optional_float(x: Any) -> Optional[float]:
+    return None if x is None else from_float(x)
 
 
 def from_list(f: Callable[[Any], T], x: Any) -> List[T]:
@@ -65,7 +78,7 @@ def to_class(c: Type[T], x: Any) -> dict:
     return cast(Any, x).to_dict()
 
 
-@dataclass(order=True)
+@dataclass(order=True, slots=True)
 class MemberTimeDataclass:
     """Class for keeping member connected time and current role"""
 
@@ -104,34 +117,20 @@ class MemberTimeDataclass:
     @staticmethod
     def from_dict(obj: Any) -> "MemberTimeDataclass":
         assert isinstance(obj, dict)
-        name = obj.get("name")
-        id = obj.get("id")
-        highest_role_id = obj.get("highest_role_id")
-        connected_at = from_datetime(obj.get("connected_at"))
-        disconnected_at = from_union(
-            [from_none, from_datetime], obj.get("disconnected_at")
-        )
-        last_connected_by = from_union(
-            [from_float, from_none], obj.get("last_connected_by")
-        )
-        expected_exponential_intervals = from_union(
-            [lambda x: from_list(from_float, x), from_none],
-            obj.get("expected_exponential_intervals"),
-        )
-        total_minutes_connected = obj.get("total_minutes_connected")
-        last_connected_at = from_union(
-            [from_none, from_datetime], obj.get("last_connected_at")
-        )
+        get = obj.get
+        intervals = get("expected_exponential_intervals")
         return MemberTimeDataclass(
-            name=name,
-            id=id,
-            highest_role_id=highest_role_id,
-            connected_at=connected_at,
-            disconnected_at=disconnected_at,
-            last_connected_by=last_connected_by,
-            expected_exponential_intervals=expected_exponential_intervals,
-            total_minutes_connected=total_minutes_connected,
-            last_connected_at=last_connected_at,
+            name=get("name"),
+            id=get("id"),
+            highest_role_id=get("highest_role_id"),
+            connected_at=from_datetime(get("connected_at")),
+            disconnected_at=from_optional_datetime(get("disconnected_at")),
+            last_connected_by=from_optional_float(get("last_connected_by")),
+            expected_exponential_intervals=(
+                None if intervals is None else from_list(from_float, intervals)
+            ),
+            total_minutes_connected=get("total_minutes_connected"),
+            last_connected_at=from_optional_datetime(get("last_connected_at")),
         )
 
     def to_dict(self) -> dict:
@@ -164,13 +163,33 @@ class MemberTimeDataclass:
             if self.last_connected_at is not None
             else None
         )
-        result["expected_exponential_intervals"] = self.expected_exponential_intervals
+        result["expected_exponential_intervals"] = (
+            list(self.expected_exponential_intervals)
+            if self.expected_exponential_intervals is not None
+            else None
+        )
         result["total_minutes_connected"] = self.total_minutes_connected
         return result
 
 
+def share_intervals(members: List[MemberTimeDataclass]) -> List[MemberTimeDataclass]:
+    """
+    Members with the same role have the same expected intervals, keep a single
+    float object per distinct value instead of one per member
+    """
+    floats: Dict[float, float] = {}
+    share = floats.setdefault
+    for member in members:
+        intervals = member.expected_exponential_intervals
+        if intervals:
+            member.expected_exponential_intervals = [share(x, x) for x in intervals]
+    return members
+
+
 def member_time_dataclass_from_dict(s: Any) -> List[MemberTimeDataclass]:
-    return from_list(MemberTimeDataclass.from_dict, s)
+    assert isinstance(s, list)
+    from_dict = MemberTimeDataclass.from_dict
+    return share_intervals([from_dict(x) for x in s])
 
 
 def member_time_dataclass_to_dict(x: List[MemberTimeDataclass]) -> Any:
@@ -0,0 +1,134 @@
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from decouple import config
+
+# Tokens added by the API around every message, like the role
+MESSAGE_OVERHEAD = 4
+# Rough tokens per character of the models, refined with the usage
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(content: str) -> int:
+    return MESSAGE_OVERHEAD + (len(content) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass(slots=True)
+class Turn:
+    role: str
+    content: str
+    tokens: int
+
+    def to_message(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+class Conversation:
+    """Turns of a channel, the token estimate is counted once per turn"""
+
+    def __init__(self) -> None:
+        self.turns: Deque[Turn] = deque()
+        self.tokens = 0
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def add(self, role: str, content: str) -> Turn:
+        turn = Turn(role, content, estimate_tokens(content))
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+        return turn
+
+    def drop_oldest(self) -> Turn:
+        turn = self.turns.popleft()
+        self.tokens -= turn.tokens
+        return turn
+
+    def discard(self, turn: Turn) -> None:
+        """Remove the turn, unless the window already dropped it"""
+        # Newer turns may have been added by the other messages of the channel
+        for i in range(len(self.turns) - 1, -1, -1):
+            if self.turns[i] is turn:
+                del self.turns[i]
+                self.tokens -= turn.tokens
+                return
+
+
+class ConversationContexts:
+    """
+    History of the conversations of every channel, in a bounded LRU.
+
+    Prompts are kept under the token budget with a sliding window: the
+    oldest turns are dropped until the system prompt and the remaining turns
+    fit. The character based estimates are scaled by the ratio between the
+    prompt tokens reported in the usage of the responses and the estimates.
+    """
+
+    _shared: Optional["ConversationContexts"] = None
+
+    def __init__(self, budget: int = 3000, max_channels: int = 256) -> None:
+        self.budget = budget
+        self.max_channels = max_channels
+        self.ratio = 1.0
+        self._conversations: OrderedDict[int, Conversation] = OrderedDict()
+
+    @classmethod
+    def shared(cls) -> "ConversationContexts":
+        """Contexts shared by every handler, configured from .env"""
+        if cls._shared is None:
+            cls._shared = cls(
+                budget=config("OPEN_AI_PROMPT_BUDGET", default=3000, cast=int),
+                max_channels=config("OPEN_AI_CONVERSATIONS", default=256, cast=int),
+            )
+        return cls._shared
+
+    def get(self, channel_id: int) -> Conversation:
+        conversation = self._conversations.get(channel_id)
+        if conversation is None:
+            conversation = Conversation()
+            self._conversations[channel_id] = conversation
+            while len(self._conversations) > self.max_channels:
+                self._conversations.popitem(last=False)
+        self._conversations.move_to_end(channel_id)
+        return conversation
+
+    def forget(self, channel_id: int) -> None:
+        self._conversations.pop(channel_id, None)
+
+    def calibrate(self, estimated: int, prompt_tokens: int) -> None:
+        """Move the ratio towards what the API counted for an estimated prompt"""
+        if estimated > 0 and prompt_tokens > 0:
+            self.ratio += 0.2 * (prompt_tokens / estimated - self.ratio)
+
+    def fits(self, tokens: int) -> bool:
+        return tokens * self.ratio <= self.budget
+
+    def window(
+        self, conversation: Conversation, system_role: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, str]]:
+        """Messages of the conversation under the budget, dropping the oldest"""
+        fixed = estimate_tokens(system_role["content"]) if system_role else 0
+        # The last turn is always sent, even over the budget
+        while len(conversation) > 1 and not self.fits(fixed + conversation.tokens):
+            conversation.drop_oldest()
+        messages = [turn.to_message() for turn in conversation.turns]
+        return [system_role, *messages] if system_role else messages
+
+    def fit(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Newest messages under the budget, the system ones are always kept"""
+        system = [message for message in messages if message["role"] == "system"]
+        tokens = sum(estimate_tokens(message["content"]) for message in system)
+        kept: List[Dict[str, str]] = []
+        for message in reversed(messages):
+            if message["role"] == "system":
+                continue
+            tokens += estimate_tokens(message["content"])
+            if len(kept) != 0 and not self.fits(tokens):
+                break
+            kept.append(message)
+        return [*system, *reversed(kept)]
+
+
+def prompt_estimate(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(message["content"]) for message in messages)
@@ -1,45 +1,243 @@
+from contextlib import aclosing
 import logging
-from typing import Dict, List
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 from domain.gpt_chat_response import GPTChatResponse, gpt_chat_response_from_dict
 from domain.response import Response, response_from_dict
-from configparser import ConfigParser
-import openai
-import os
 
-from utils.async_tools import asAsync
+from modules.conversation import ConversationContexts, estimate_tokens, prompt_estimate
+from modules.openai_client import OpenAiClient
+from modules.response_cache import ResponseCache, cache_key
+from modules.usage_ledger import Requester, UsageLedger
 from utils.logger import AppLogger
+from utils.settings import OpenAiSettings, Settings
 
 
 class OpenAiHandler:
-    def __init__(self, key: str) -> None:
-        self._key = key
+    def __init__(
+        self,
+        key: str,
+        client: Optional[OpenAiClient] = None,
+        cache: Optional[ResponseCache] = None,
+        contexts: Optional[ConversationContexts] = None,
+        settings: Optional[Settings] = None,
+        usage: Optional[UsageLedger] = None,
+    ) -> None:
+        self._client = client or OpenAiClient.shared(key)
+        self._cache = cache or ResponseCache.shared()
+        self.contexts = contexts or ConversationContexts.shared()
+        self.settings = settings or Settings.shared()
+        self.usage = usage or UsageLedger.shared()
         self.logger = AppLogger().logger
-        config = ConfigParser()
-        config.read("config.ini")
-        self.model = config["SETTINGS"]["open_ai_model"]
 
-    @asAsync
-    def query(self, prompt: str) -> Response:
+    @property
+    def model(self) -> str:
+        return self.settings.openai.model
+
+    async def query(
+        self,
+        prompt: str,
+        use_cache: bool = True,
+        priority: int = 0,
+        requester: Optional[Requester] = None,
+    ) -> Response:
         self.logger.log(logging.INFO, f"Using ChatGPT, querying: {prompt}")
-        openai.api_key = self._key
-        response = openai.Completion.create(
-            model="text-davinci-003", prompt=prompt, temperature=0.8, max_tokens=1000
+        settings = self.settings.openai
+        request = dict(
+            model=settings.completion_model,
+            prompt=prompt,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+        )
+        response = await self.cached(
+            [{"role": "user", "content": prompt}],
+            use_cache,
+            self._client.completions,
+            request,
+            priority,
+            requester,
         )
         return response_from_dict(response)
 
-    @asAsync
-    def chat(self, current_messages: List[Dict[str, str]]) -> GPTChatResponse:
-        self.logger.info(f"Current Messages: {len(current_messages)}")
-        system_role = {
-            "role": "system",
-            "content": 'Você agora é conhecido como: EVA 01, uma unidade Mecha de combate descrita no Anime Evangelion. A Unidade Eva 01 foi produzido em 2004 pelo Terceiro Anexo de Laboratórios de Evolução Artificial da antiga Gehirn, em Hakone, como um modelo "Evangelion Test Type".',
-        }
-        openai.api_key = self._key
-        response = openai.ChatCompletion.create(
-            model=self.model,
-            messages=[
-                system_role,
-                *current_messages,
-            ],
+    async def chat(
+        self,
+        current_messages: List[Dict[str, str]],
+        use_cache: bool = True,
+        priority: int = 0,
+        requester: Optional[Requester] = None,
+    ) -> GPTChatResponse:
+        """Answer the newest messages that fit in the prompt budget"""
+        settings = self.settings.openai
+        messages = self.contexts.fit(self.with_system_role(current_messages, settings))
+        return await self.send_chat(messages, use_cache, priority, settings, requester)
+
+    async def converse(
+        self,
+        channel_id: int,
+        content: str,
+        use_cache: bool = True,
+        priority: int = 0,
+        requester: Optional[Requester] = None,
+    ) -> GPTChatResponse:
+        """Answer a message with the history of its channel as the context"""
+        settings = self.settings.openai
+        conversation = self.contexts.get(channel_id)
+        turn = conversation.add("user", content)
+        messages = self.contexts.window(conversation, self.system_role(settings))
+        try:
+            response = await self.send_chat(
+                messages, use_cache, priority, settings, requester
+            )
+        except BaseException:
+            # Unanswered, the next prompts must not carry it
+            conversation.discard(turn)
+            raise
+        message = response.choices[0].message
+        conversation.add(message.role, message.content)
+        return response
+
+    async def send_chat(
+        self,
+        messages: List[Dict[str, str]],
+        use_cache: bool = True,
+        priority: int = 0,
+        settings: Optional[OpenAiSettings] = None,
+        requester: Optional[Requester] = None,
+    ) -> GPTChatResponse:
+        settings = settings or self.settings.openai
+        estimated = prompt_estimate(messages)
+        self.logger.info(
+            f"Current Messages: {len(messages)}, about {estimated * self.contexts.ratio:.0f} tokens"
+        )
+        request = dict(
+            model=settings.model,
+            messages=messages,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+        )
+        response = gpt_chat_response_from_dict(
+            await self.cached(
+                messages,
+                use_cache,
+                self._client.chat_completions,
+                request,
+                priority,
+                requester,
+            )
+        )
+        self.contexts.calibrate(estimated, response.usage.prompt_tokens)
+        return response
+
+    async def cached(
+        self,
+        messages: List[Dict[str, str]],
+        use_cache: bool,
+        send: Callable[..., Awaitable[Dict[str, Any]]],
+        request: Dict[str, Any],
+        priority: int = 0,
+        requester: Optional[Requester] = None,
+    ) -> Dict[str, Any]:
+        """
+        Cached response of the request, sent upstream on a miss or a bypass.
+        Identical requests sent while it is in flight wait for its response
+        instead of sending their own. The budget of the requester is only
+        checked on a miss, and only the requests sent upstream are recorded
+        in the usage ledger.
+        """
+
+        def key_of(model: str) -> str:
+            return cache_key(
+                model,
+                messages,
+                temperature=request["temperature"],
+                max_tokens=request["max_tokens"],
+            )
+
+        key = key_of(request["model"])
+        response = await self.lookup(key, use_cache)
+        if response is not None:
+            return response
+
+        model = self.usage.admit(requester, request["model"])
+        if model != request["model"]:
+            # Downgraded, the answer of that model may be cached as well
+            request = {**request, "model": model}
+            key = key_of(model)
+            response = await self.lookup(key, use_cache)
+            if response is not None:
+                return response
+
+        async def fetch() -> Dict[str, Any]:
+            start = time.perf_counter()
+            response = await send(priority=priority, **request)
+            usage = response.get("usage") or {}
+            self.usage.record(
+                requester,
+                request["model"],
+                usage.get("prompt_tokens", 0),
+                usage.get("completion_tokens", 0),
+                time.perf_counter() - start,
+            )
+            await self._cache.put(key, response)
+            return response
+
+        return await self._client.flights.do(key, fetch)
+
+    async def lookup(self, key: str, use_cache: bool) -> Optional[Dict[str, Any]]:
+        if not use_cache:
+            return None
+        response = await self._cache.get(key)
+        if response is not None:
+            self.logger.debug("Answered from the response cache")
+        return response
+
+    async def chat_stream(
+        self,
+        current_messages: List[Dict[str, str]],
+        priority: int = 0,
+        requester: Optional[Requester] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Same as chat, yielding the text of the answer while it is generated.
+        A caller that stops reading early must aclose() it, to release the
+        slot of the model right away.
+        """
+        settings = self.settings.openai
+        messages = self.contexts.fit(self.with_system_role(current_messages, settings))
+        model = self.usage.admit(requester, settings.model)
+        self.logger.info(f"Current Messages: {len(messages)}, streaming")
+        start = time.perf_counter()
+        texts = []
+        stream = self._client.stream_chat_completions(
+            priority,
+            model=model,
+            messages=messages,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+        )
+        async with aclosing(stream):
+            async for text in stream:
+                texts.append(text)
+                yield text
+        # Streamed chunks have no usage, the tokens are estimated
+        self.usage.record(
+            requester,
+            model,
+            round(prompt_estimate(messages) * self.contexts.ratio),
+            round(estimate_tokens("".join(texts)) * self.contexts.ratio),
+            time.perf_counter() - start,
         )
-        return gpt_chat_response_from_dict(response)
+
+    def with_system_role(
+        self,
+        current_messages: List[Dict[str, str]],
+        settings: Optional[OpenAiSettings] = None,
+    ) -> List[Dict[str, str]]:
+        return [
+            self.system_role(settings),
+            *current_messages,
+        ]
+
+    def system_role(self, settings: Optional[OpenAiSettings] = None) -> Dict[str, str]:
+        settings = settings or self.settings.openai
+        return {"role": "system", "content": settings.system_prompt}
@@ -0,0 +1,210 @@
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import json
+import random
+
+import aiohttp
+from decouple import config
+
+from modules.request_limiter import PrioritySemaphore, SingleFlight
+from utils.logger import AppLogger
+
+
+class OpenAiError(Exception):
+    """Answer of the API with an error status"""
+
+    def __init__(self, status: int, body: str) -> None:
+        super().__init__(f"OpenAI answered {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+
+class OpenAiClient:
+    """
+    Async client of the OpenAI REST API.
+
+    Every request goes through a single aiohttp session, so the connections
+    are kept alive and reused, and no more than max_concurrency requests are
+    sent at the same time. The session is created on the first request,
+    inside the running loop.
+
+    Requests of every model wait for one of its model_concurrency slots,
+    by priority, and are retried with an exponential backoff and jitter when
+    the API answers with 429 or a server error.
+
+    Streams have no total timeout, a long generation takes as long as it
+    needs, but every read of the stream must arrive within timeout seconds.
+    """
+
+    _shared: Dict[str, "OpenAiClient"] = {}
+
+    def __init__(
+        self,
+        key: str,
+        base_url: str = "https://api.openai.com/v1",
+        max_concurrency: int = 8,
+        timeout: float = 60,
+        connect_timeout: float = 10,
+        model_concurrency: Optional[int] = None,
+        max_retries: int = 3,
+        backoff: float = 1,
+    ) -> None:
+        self.logger = AppLogger().logger
+        self._key = key
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency or max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.stream_timeout = aiohttp.ClientTimeout(
+            total=None, connect=connect_timeout, sock_read=timeout
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.limits: Dict[str, PrioritySemaphore] = {}
+        self.flights = SingleFlight()
+        self.retries = 0
+
+    @classmethod
+    def shared(cls, key: str) -> "OpenAiClient":
+        """Client of the key shared by every handler, configured from .env"""
+        client = cls._shared.get(key)
+        if client is None:
+            client = cls(
+                key,
+                base_url=config("OPEN_AI_BASE_URL", default="https://api.openai.com/v1"),
+                max_concurrency=config("OPEN_AI_CONCURRENCY", default=8, cast=int),
+                timeout=config("OPEN_AI_TIMEOUT", default=60, cast=float),
+                model_concurrency=config("OPEN_AI_MODEL_CONCURRENCY", default=4, cast=int),
+                max_retries=config("OPEN_AI_MAX_RETRIES", default=3, cast=int),
+                backoff=config("OPEN_AI_BACKOFF", default=1, cast=float),
+            )
+            cls._shared[key] = client
+        return client
+
+    @classmethod
+    def shared_clients(cls) -> List["OpenAiClient"]:
+        return list(cls._shared.values())
+
+    @classmethod
+    async def close_shared(cls) -> None:
+        for client in list(cls._shared.values()):
+            await client.close()
+        cls._shared.clear()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self._key}"},
+            )
+        return self._session
+
+    def limit(self, model: str) -> PrioritySemaphore:
+        semaphore = self.limits.get(model)
+        if semaphore is None:
+            semaphore = PrioritySemaphore(self.model_concurrency)
+            self.limits[model] = semaphore
+        return semaphore
+
+    def queue_metrics(self) -> Dict[str, Any]:
+        """Slots waited for by model, retries and requests that were coalesced"""
+        return {
+            "models": {
+                model: {
+                    "waiting": semaphore.waiting,
+                    "acquired": semaphore.acquired,
+                    "mean_wait": semaphore.mean_wait,
+                    "max_wait": semaphore.max_wait,
+                }
+                for model, semaphore in self.limits.items()
+            },
+            "retries": self.retries,
+            "coalesced": self.flights.coalesced,
+        }
+
+    async def _send(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+    ) -> aiohttp.ClientResponse:
+        """Send the request, retrying the retryable errors"""
+        session = self._get_session()
+        for attempt in range(self.max_retries + 1):
+            response = await session.post(
+                self.base_url + path, json=payload, timeout=timeout or self.timeout
+            )
+            if response.status < 400:
+                return response
+            body = await response.text()
+            response.release()
+            retryable = response.status == 429 or response.status >= 500
+            if not retryable or attempt == self.max_retries:
+                raise OpenAiError(response.status, body)
+            delay = self.backoff * 2**attempt * (1 + random.random())
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            self.retries += 1
+            self.logger.warning(
+                f"[{self.__class__.__name__}] {path} got {response.status}, retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+    async def post(
+        self, path: str, payload: Dict[str, Any], priority: int = 0
+    ) -> Dict[str, Any]:
+        async with self.limit(payload["model"]).slot(priority):
+            async with await self._send(path, payload) as response:
+                return await response.json()
+
+    async def stream(
+        self, path: str, payload: Dict[str, Any], priority: int = 0
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Send a streamed request and yield every server-sent event.
+
+        The slot of the model is held until the stream ends, a caller that
+        stops reading before must aclose() the generator to release it.
+        """
+        async with self.limit(payload["model"]).slot(priority):
+            payload = {**payload, "stream": True}
+            async with await self._send(
+                path, payload, self.stream_timeout
+            ) as response:
+                async for line in response.content:
+                    if not line.startswith(b"data:"):
+                        # Blank separators and comments
+                        continue
+                    data = line[len(b"data:") :].strip()
+                    if data == b"[DONE]":
+                        return
+                    yield json.loads(data)
+
+    async def completions(self, priority: int = 0, **payload: Any) -> Dict[str, Any]:
+        return await self.post("/completions", payload, priority)
+
+    async def chat_completions(
+        self, priority: int = 0, **payload: Any
+    ) -> Dict[str, Any]:
+        return await self.post("/chat/completions", payload, priority)
+
+    async def stream_chat_completions(
+        self, priority: int = 0, **payload: Any
+    ) -> AsyncIterator[str]:
+        """Yield the text of the first choice as it is generated, see stream"""
+        chunks = self.stream("/chat/completions", payload, priority)
+        # Closing this generator closes the stream and releases its slot
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                choices = chunk.get("choices") or [{}]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    yield content
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
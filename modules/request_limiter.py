@@ -0,0 +1,95 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple, TypeVar
+import asyncio
+import heapq
+import itertools
+
+T = TypeVar("T")
+
+
+class PrioritySemaphore:
+    """
+    Semaphore whose waiters are served by priority, lower first, and in
+    arrival order within the same priority. Keeps how long the callers
+    waited for a slot.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.acquired if self.acquired else 0
+
+    async def acquire(self, priority: int = 0) -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        if self._active < self.limit and self.waiting == 0:
+            self._active += 1
+        else:
+            future = loop.create_future()
+            heapq.heappush(self._waiters, (priority, next(self._arrivals), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # The slot was handed over right before the cancellation
+                if future.done() and not future.cancelled():
+                    self.release()
+                raise
+        wait = loop.time() - start
+        self.acquired += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot goes straight to the waiter
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class SingleFlight:
+    """Identical calls in flight at the same time share a single execution"""
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(call())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._land(key, done))
+        else:
+            self.coalesced += 1
+        # A caller that is cancelled does not cancel the others
+        return await asyncio.shield(flight)
+
+    def _land(self, key: str, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # Retrieved even if every caller was cancelled
+            flight.exception()
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from os import path
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from decouple import config
+
+from utils.async_tools import asAsync
+from utils.logger import AppLogger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at);
+"""
+SELECT = "SELECT expires_at, value FROM responses WHERE key = ? AND expires_at > ?"
+INSERT = "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)"
+PURGE = "DELETE FROM responses WHERE expires_at <= ?"
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(model: str, messages: List[Dict[str, str]], **params: Any) -> str:
+    """Hash of the model, the messages, system prompt included, and parameters"""
+    normalized = [
+        {"role": message["role"], "content": normalize(message["content"])}
+        for message in messages
+    ]
+    payload = json.dumps([model, normalized, params], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU cache of API responses that expire after ttl seconds.
+
+    Responses are kept as the raw json payload. With a directory they are
+    also written to a SQLite database, which is looked up on a memory miss,
+    so the cache survives restarts. The database is only accessed from the
+    io pool, one thread at a time.
+    """
+
+    _shared: Optional["ResponseCache"] = None
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600,
+        directory: Optional[str] = None,
+    ) -> None:
+        self.logger = AppLogger().logger
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._connection: Optional[sqlite3.Connection] = None
+        # The io pool may read and write from several threads at once
+        self._connection_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(
+                path.join(directory, "responses.db"), check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+    @classmethod
+    def shared(cls) -> "ResponseCache":
+        """Cache shared by every handler, configured from .env"""
+        if cls._shared is None:
+            cls._shared = cls(
+                max_entries=config("OPEN_AI_CACHE_SIZE", default=1024, cast=int),
+                ttl=config("OPEN_AI_CACHE_TTL", default=3600, cast=float),
+                directory=config("OPEN_AI_CACHE_DIR", default="") or None,
+            )
+        return cls._shared
+
+    @classmethod
+    def close_shared(cls) -> None:
+        if cls._shared is not None:
+            cls._shared.close()
+            cls._shared = None
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._entries[key]
+            entry = None
+        if entry is None and self._connection is not None:
+            entry = await self._read(key, now)
+            if entry is not None:
+                self.disk_hits += 1
+                self._remember(key, entry)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.saved_tokens += entry[1].get("usage", {}).get("total_tokens", 0)
+        return entry[1]
+
+    async def put(self, key: str, value: Dict[str, Any]) -> None:
+        entry = (time.time() + self.ttl, value)
+        self._remember(key, entry)
+        if self._connection is not None:
+            try:
+                await self._write(key, entry)
+            except sqlite3.Error as e:
+                self.logger.error(f"[{self.__class__.__name__}] Write failed {e}")
+
+    def _remember(self, key: str, entry: Tuple[float, Dict[str, Any]]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @asAsync
+    def _read(self, key: str, now: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self._connection_lock:
+            row = self._connection.execute(SELECT, (key, now)).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    @asAsync
+    def _write(self, key: str, entry: Tuple[float, Dict[str, Any]]) -> None:
+        with self._connection_lock, self._connection:
+            self._connection.execute(INSERT, (key, entry[0], json.dumps(entry[1])))
+            self._connection.execute(PURGE, (time.time(),))
+
+    def close(self) -> None:
+        if self._connection is not None:
+            with self._connection_lock:
+                self._connection.close()
+            self._connection = None
@@ -0,0 +1,299 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from os import path
+import os
+import sqlite3
+import threading
+import time
+
+from decouple import config
+
+from utils.async_tools import asAsync
+from utils.logger import AppLogger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    at REAL NOT NULL,
+    guild_id INTEGER,
+    user_id INTEGER,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS usage_at ON usage (at);
+"""
+SELECT = "SELECT * FROM usage WHERE at > ? ORDER BY at"
+INSERT = "INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?)"
+PURGE = "DELETE FROM usage WHERE at <= ?"
+
+# Rows older than this are deleted from the database
+RETENTION = 30 * 24 * 3600
+
+Row = Tuple[float, Optional[int], Optional[int], str, int, int, float]
+
+
+class BudgetExceeded(Exception):
+    """The guild or the user spent its tokens of the budget window"""
+
+    def __init__(self, scope: str, spent: int, budget: int) -> None:
+        super().__init__(f"The {scope} used {spent} of its {budget} tokens")
+        self.scope = scope
+        self.spent = spent
+        self.budget = budget
+
+
+@dataclass(frozen=True, slots=True)
+class Requester:
+    """Who a request is made for, to account and cap its usage"""
+
+    guild_id: Optional[int] = None
+    user_id: Optional[int] = None
+
+
+class RollingWindow:
+    """Tokens and requests of the last span seconds, counted in buckets"""
+
+    __slots__ = ("span", "width", "_buckets", "tokens", "requests")
+
+    def __init__(self, span: float, buckets: int = 60) -> None:
+        self.span = span
+        self.width = span / buckets
+        # Start of the bucket, its tokens and requests
+        self._buckets: Deque[List[float]] = deque()
+        self.tokens = 0
+        self.requests = 0
+
+    def _expire(self, now: float) -> None:
+        while self._buckets and self._buckets[0][0] <= now - self.span:
+            _, tokens, requests = self._buckets.popleft()
+            self.tokens -= tokens
+            self.requests -= requests
+
+    def add(self, at: float, tokens: int) -> None:
+        start = at - at % self.width
+        if self._buckets and self._buckets[-1][0] == start:
+            self._buckets[-1][1] += tokens
+            self._buckets[-1][2] += 1
+        else:
+            self._buckets.append([start, tokens, 1])
+        self.tokens += tokens
+        self.requests += 1
+        self._expire(at)
+
+    def total(self, now: float) -> int:
+        self._expire(now)
+        return self.tokens
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest rank percentile of sorted values"""
+    if len(values) == 0:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class UsageLedger:
+    """
+    Tokens used by every guild, user and model in a rolling window, and the
+    latencies of the last requests of every model.
+
+    A guild or a user over its budget of tokens in the window is either
+    rejected or sent to the downgrade model. Requests are stored in a
+    SQLite database in batches by flush(), and the window is rebuilt from
+    it on start.
+    """
+
+    _shared: Optional["UsageLedger"] = None
+
+    def __init__(
+        self,
+        window: float = 24 * 3600,
+        guild_budget: int = 0,
+        user_budget: int = 0,
+        downgrade_model: Optional[str] = None,
+        directory: Optional[str] = None,
+        latency_samples: int = 1000,
+    ) -> None:
+        self.logger = AppLogger().logger
+        self.window = window
+        self.guild_budget = guild_budget
+        self.user_budget = user_budget
+        self.downgrade_model = downgrade_model
+        self.latency_samples = latency_samples
+        self._windows: Dict[Tuple[str, object], RollingWindow] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._pending: List[Row] = []
+        self.rejected = 0
+        self.downgraded = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        # The io pool may write from a thread while another one is closing
+        self._connection_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(
+                path.join(directory, "usage.db"), check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+            self._restore()
+
+    @classmethod
+    def shared(cls) -> "UsageLedger":
+        """Ledger shared by every handler, configured from .env"""
+        if cls._shared is None:
+            cls._shared = cls(
+                window=config("OPEN_AI_BUDGET_WINDOW", default=24 * 3600, cast=float),
+                guild_budget=config("OPEN_AI_GUILD_BUDGET", default=0, cast=int),
+                user_budget=config("OPEN_AI_USER_BUDGET", default=0, cast=int),
+                downgrade_model=config("OPEN_AI_DOWNGRADE_MODEL", default="") or None,
+                directory=config("OPEN_AI_USAGE_DIR", default="")
+                or config("MEMBER_DATA_DIR", default="guilds"),
+            )
+        return cls._shared
+
+    @classmethod
+    def close_shared(cls) -> None:
+        if cls._shared is not None:
+            cls._shared.close()
+            cls._shared = None
+
+    def _restore(self) -> None:
+        rows = self._connection.execute(SELECT, (time.time() - self.window,))
+        for at, guild_id, user_id, model, prompt, completion, latency in rows:
+            self._account(at, guild_id, user_id, model, prompt + completion, latency)
+
+    def _window(self, scope: str, id: object) -> RollingWindow:
+        window = self._windows.get((scope, id))
+        if window is None:
+            window = RollingWindow(self.window)
+            self._windows[(scope, id)] = window
+        return window
+
+    def _account(
+        self,
+        at: float,
+        guild_id: Optional[int],
+        user_id: Optional[int],
+        model: str,
+        tokens: int,
+        latency: float,
+    ) -> None:
+        if guild_id is not None:
+            self._window("guild", guild_id).add(at, tokens)
+        if user_id is not None:
+            self._window("user", user_id).add(at, tokens)
+        self._window("model", model).add(at, tokens)
+        latencies = self._latencies.get(model)
+        if latencies is None:
+            latencies = deque(maxlen=self.latency_samples)
+            self._latencies[model] = latencies
+        latencies.append(latency)
+
+    def tokens(self, scope: str, id: object) -> int:
+        """Tokens of the guild, user or model in the window"""
+        window = self._windows.get((scope, id))
+        return 0 if window is None else window.total(time.time())
+
+    def requests(self, scope: str, id: object) -> int:
+        window = self._windows.get((scope, id))
+        if window is None:
+            return 0
+        window.total(time.time())
+        return window.requests
+
+    def models(self) -> List[str]:
+        return [id for scope, id in self._windows if scope == "model"]
+
+    def latency_percentiles(
+        self, model: str, percentiles: Iterable[float] = (50, 95, 99)
+    ) -> Dict[float, float]:
+        latencies = sorted(self._latencies.get(model, ()))
+        return {p: percentile(latencies, p) for p in percentiles}
+
+    def _over_budget(self, requester: Requester) -> Optional[BudgetExceeded]:
+        checks = (
+            ("guild", requester.guild_id, self.guild_budget),
+            ("user", requester.user_id, self.user_budget),
+        )
+        for scope, id, budget in checks:
+            if id is None or budget <= 0:
+                continue
+            spent = self.tokens(scope, id)
+            if spent >= budget:
+                return BudgetExceeded(scope, spent, budget)
+        return None
+
+    def admit(self, requester: Optional[Requester], model: str) -> str:
+        """Model to send the request with, raises BudgetExceeded if rejected"""
+        if requester is None:
+            return model
+        exceeded = self._over_budget(requester)
+        if exceeded is None:
+            return model
+        if self.downgrade_model is not None:
+            if model != self.downgrade_model:
+                self.downgraded += 1
+            return self.downgrade_model
+        self.rejected += 1
+        raise exceeded
+
+    def record(
+        self,
+        requester: Optional[Requester],
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency: float,
+    ) -> None:
+        requester = requester or Requester()
+        at = time.time()
+        self._account(
+            at,
+            requester.guild_id,
+            requester.user_id,
+            model,
+            prompt_tokens + completion_tokens,
+            latency,
+        )
+        if self._connection is not None:
+            self._pending.append(
+                (
+                    at,
+                    requester.guild_id,
+                    requester.user_id,
+                    model,
+                    prompt_tokens,
+                    completion_tokens,
+                    latency,
+                )
+            )
+
+    async def flush(self) -> None:
+        """Store the requests recorded since the last flush"""
+        if not self._pending or self._connection is None:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            await self._write(rows)
+        except sqlite3.Error as e:
+            # Kept for the next flush
+            self._pending[:0] = rows
+            self.logger.error(f"[{self.__class__.__name__}] Write failed {e}")
+
+    @asAsync
+    def _write(self, rows: List[Row]) -> None:
+        with self._connection_lock, self._connection:
+            self._connection.executemany(INSERT, rows)
+            self._connection.execute(PURGE, (time.time() - RETENTION,))
+
+    def close(self) -> None:
+        if self._connection is not None:
+            with self._connection_lock:
+                if self._pending:
+                    with self._connection:
+                        self._connection.executemany(INSERT, self._pending)
+                    self._pending = []
+                self._connection.close()
+            self._connection = None
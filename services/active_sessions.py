@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from models.member_time import MemberTimeDataclass
+
+
+@dataclass(slots=True)
+class ActiveSession:
+    member_id: int
+    started_at: datetime
+    # Time until which the session is already in total_minutes_connected
+    accounted_until: datetime
+
+
+def minutes_between(start: datetime, end: datetime) -> float:
+    return max((end - start).total_seconds(), 0) / 60
+
+
+class ActiveSessions:
+    """Voice sessions of the members connected right now"""
+
+    def __init__(self) -> None:
+        self._sessions: Dict[int, ActiveSession] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[ActiveSession]:
+        return iter(list(self._sessions.values()))
+
+    def __contains__(self, member_id: int) -> bool:
+        return member_id in self._sessions
+
+    def get(self, member_id: int) -> Optional[ActiveSession]:
+        return self._sessions.get(member_id)
+
+    def start(self, member_id: int, at: datetime) -> ActiveSession:
+        session = ActiveSession(member_id, started_at=at, accounted_until=at)
+        self._sessions[member_id] = session
+        return session
+
+    def pending_minutes(self, member_id: int, now: datetime) -> float:
+        """Minutes of the session not yet added to the member total"""
+        session = self._sessions.get(member_id)
+        if session is None:
+            return 0
+        return minutes_between(session.accounted_until, now)
+
+    def live_minutes(self, member: MemberTimeDataclass, now: datetime) -> float:
+        return member.total_minutes_connected + self.pending_minutes(member.id, now)
+
+    def checkpoint(self, member_id: int, now: datetime) -> float:
+        """Return the pending minutes and mark them as accounted"""
+        minutes = self.pending_minutes(member_id, now)
+        session = self._sessions.get(member_id)
+        if session is not None:
+            session.accounted_until = now
+        return minutes
+
+    def close(self, member_id: int, now: datetime) -> float:
+        """End the session returning the minutes not accounted yet"""
+        minutes = self.pending_minutes(member_id, now)
+        self._sessions.pop(member_id, None)
+        return minutes
+
+    def discard(self, member_id: int) -> None:
+        """End the session without accounting anything after the last checkpoint"""
+        self._sessions.pop(member_id, None)
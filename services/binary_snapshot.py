@@ -0,0 +1,336 @@
+"""
+Compact binary snapshot of the member times.
+
+The file holds a fixed size header, one fixed-width record per member and a
+single block with every expected interval packed one after the other.
+Timestamps are stored as microseconds since the epoch, so a snapshot converts
+to and from the json produced by member_time_dataclass_to_dict without loss.
+The storage keeps the packed record of every member and only packs the
+dirty members again on a flush.
+"""
+from dataclasses import replace
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Any, Dict, List, Optional, Set, Tuple
+from os import path
+import json
+import math
+import sys
+
+import numpy as np
+
+from models.member_time import (
+    MemberTimeDataclass,
+    member_time_dataclass_from_dict,
+    member_time_dataclass_to_dict,
+    share_intervals,
+)
+from services.member_storage import MemberStorage, write_atomically
+from services.member_store import MemberTimeRepository
+from utils.async_tools import asAsync
+
+MAGIC = b"EVAMTSNP"
+VERSION = 1
+# Discord usernames have at most 32 characters
+NAME_LENGTH = 32
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("interval_dtype", "S4"),
+        ("members", "<u8"),
+        ("intervals", "<u8"),
+    ]
+)
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("id", "<u8"),
+        ("highest_role_id", "<u8"),
+        ("connected_at", "<i8"),
+        ("disconnected_at", "<i8"),
+        ("last_connected_at", "<i8"),
+        ("last_connected_by", "<f8"),
+        ("total_minutes_connected", "<f8"),
+        ("intervals_offset", "<u8"),
+        # -1 when the intervals were not calculated yet
+        ("intervals_count", "<i4"),
+        ("name", f"<U{NAME_LENGTH}"),
+    ]
+)
+
+NO_TIMESTAMP = np.iinfo(np.int64).min
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch(x: Optional[datetime]) -> int:
+    if x is None:
+        return NO_TIMESTAMP
+    if x.tzinfo is not None:
+        raise ValueError(f"Only naive timestamps can be stored, got {x}")
+    return (x - EPOCH) // MICROSECOND
+
+
+def from_epoch(x: int) -> Optional[datetime]:
+    return None if x == NO_TIMESTAMP else EPOCH + timedelta(microseconds=x)
+
+
+def encode_member(
+    member: MemberTimeDataclass,
+) -> Tuple[Tuple[Any, ...], Optional[List[float]]]:
+    """Record of the member, with an intervals offset of 0, and its intervals"""
+    if len(member.name) > NAME_LENGTH:
+        raise ValueError(f"Member name {member.name!r} does not fit in the snapshot")
+    member_intervals = member.expected_exponential_intervals
+    last_connected_by = member.last_connected_by
+    if isinstance(last_connected_by, timedelta):
+        last_connected_by = last_connected_by.total_seconds()
+    record = (
+        member.id,
+        member.highest_role_id,
+        to_epoch(member.connected_at),
+        to_epoch(member.disconnected_at),
+        to_epoch(member.last_connected_at),
+        np.nan if last_connected_by is None else last_connected_by,
+        member.total_minutes_connected,
+        0,
+        -1 if member_intervals is None else len(member_intervals),
+        member.name,
+    )
+    return record, member_intervals
+
+
+def fit_member(member: MemberTimeDataclass) -> MemberTimeDataclass:
+    """Copy of the member with its name cut and naive local timestamps"""
+
+    def naive(x: Optional[datetime]) -> Optional[datetime]:
+        if x is None or x.tzinfo is None:
+            return x
+        return x.astimezone().replace(tzinfo=None)
+
+    return replace(
+        member,
+        name=member.name[:NAME_LENGTH],
+        connected_at=naive(member.connected_at),
+        disconnected_at=naive(member.disconnected_at),
+        last_connected_at=naive(member.last_connected_at),
+    )
+
+
+def encode_members(
+    members: List[MemberTimeDataclass], interval_dtype: str = "<f8"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack the members into records and intervals"""
+    records = np.zeros(len(members), dtype=RECORD_DTYPE)
+    intervals: List[float] = []
+    for i, member in enumerate(members):
+        record, member_intervals = encode_member(member)
+        records[i] = record
+        records["intervals_offset"][i] = len(intervals)
+        if member_intervals is not None:
+            intervals.extend(member_intervals)
+    return records, np.array(intervals, dtype=interval_dtype)
+
+
+def pack_intervals(
+    records: np.ndarray, intervals: List[Optional[Tuple[float, ...]]], dtype: str
+) -> np.ndarray:
+    """Set the offsets of the records and join the intervals of every record"""
+    counts = np.maximum(records["intervals_count"], 0)
+    records["intervals_offset"][:1] = 0
+    records["intervals_offset"][1:] = np.cumsum(counts[:-1])
+    return np.fromiter(
+        chain.from_iterable(x for x in intervals if x is not None),
+        dtype=dtype,
+        count=int(counts.sum()),
+    )
+
+
+def encode(
+    data: List[Dict[str, Any]], interval_dtype: str = "<f8"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack the json representation of the members into records and intervals"""
+    return encode_members(member_time_dataclass_from_dict(data), interval_dtype)
+
+
+def write(file: str, records: np.ndarray, intervals: np.ndarray) -> None:
+    header = np.array(
+        [(MAGIC, VERSION, intervals.dtype.str.encode(), len(records), len(intervals))],
+        dtype=HEADER_DTYPE,
+    )
+
+    def write_blocks(f):
+        f.write(header.tobytes())
+        f.write(records.tobytes())
+        f.write(intervals.tobytes())
+
+    write_atomically(file, write_blocks, mode="wb")
+
+
+def read(file: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Memory map the records and the intervals of a snapshot"""
+    header = np.fromfile(file, dtype=HEADER_DTYPE, count=1)[0]
+    if header["magic"] != MAGIC or header["version"] != VERSION:
+        raise ValueError(f"{file} is not a member time snapshot")
+    members, count = int(header["members"]), int(header["intervals"])
+    interval_dtype = np.dtype(header["interval_dtype"].decode())
+    if members == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE), np.zeros(0, dtype=interval_dtype)
+    records = np.memmap(
+        file, dtype=RECORD_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize, shape=members
+    )
+    if count == 0:
+        return records, np.zeros(0, dtype=interval_dtype)
+    intervals = np.memmap(
+        file,
+        dtype=interval_dtype,
+        mode="r",
+        offset=HEADER_DTYPE.itemsize + records.nbytes,
+        shape=count,
+    )
+    return records, intervals
+
+
+def decode(records: np.ndarray, intervals: np.ndarray) -> List[MemberTimeDataclass]:
+    # Converting whole columns at once is much faster than per record access
+    columns = {name: records[name].tolist() for name in RECORD_DTYPE.names}
+    interval_list = intervals.astype(np.float64).tolist()
+    members = []
+    for i in range(len(records)):
+        offset, count = columns["intervals_offset"][i], columns["intervals_count"][i]
+        last_connected_by = columns["last_connected_by"][i]
+        members.append(
+            MemberTimeDataclass(
+                name=columns["name"][i],
+                id=columns["id"][i],
+                highest_role_id=columns["highest_role_id"][i],
+                connected_at=from_epoch(columns["connected_at"][i]),
+                disconnected_at=from_epoch(columns["disconnected_at"][i]),
+                last_connected_at=from_epoch(columns["last_connected_at"][i]),
+                last_connected_by=(
+                    None if math.isnan(last_connected_by) else last_connected_by
+                ),
+                expected_exponential_intervals=(
+                    None if count == -1 else interval_list[offset : offset + count]
+                ),
+                total_minutes_connected=columns["total_minutes_connected"][i],
+            )
+        )
+    return share_intervals(members)
+
+
+class BinaryMemberStorage(MemberStorage):
+    """
+    Stores every member in a binary snapshot that is replaced atomically.
+
+    The records of the members are kept in an array and a flush only packs
+    the dirty members into their rows on the loop. The offsets, the interval
+    block and the disk access are left to the executor, the rows are not
+    touched again until the write finished because flushes are serialized.
+    """
+
+    def __init__(
+        self, file: str, flush_interval: float = 30, interval_dtype: str = "<f8"
+    ) -> None:
+        super().__init__(file, flush_interval)
+        # float32 halves the interval block but it is not lossless
+        self.interval_dtype = interval_dtype
+        self._records = np.zeros(0, dtype=RECORD_DTYPE)
+        # Row of every member, and the intervals of every row
+        self._rows: Dict[int, int] = {}
+        self._intervals: List[Optional[Tuple[float, ...]]] = []
+
+    def load(self) -> List[MemberTimeDataclass]:
+        if not path.exists(self.file):
+            return []
+        return decode(*read(self.file))
+
+    def bind(self, repository: MemberTimeRepository) -> None:
+        super().bind(repository)
+        self._records = np.zeros(len(repository), dtype=RECORD_DTYPE)
+        self._rows = {}
+        self._intervals = []
+        for member in repository:
+            self._pack(member)
+
+    def _encode(self, member: MemberTimeDataclass) -> Tuple[np.ndarray, Any]:
+        record, intervals = encode_member(member)
+        return np.array(record, dtype=RECORD_DTYPE), intervals
+
+    def _pack(self, member: MemberTimeDataclass) -> None:
+        try:
+            try:
+                record, intervals = self._encode(member)
+            except ValueError as e:
+                self.logger.warning(
+                    f"[{self.__class__.__name__}] {e}, storing it with a cut name and naive timestamps"
+                )
+                record, intervals = self._encode(fit_member(member))
+        except (ValueError, OverflowError) as e:
+            # Keeps its previous record, if any
+            self.logger.error(
+                f"[{self.__class__.__name__}] Member {member.id} not stored {e}"
+            )
+            return
+        row = self._rows.get(member.id)
+        if row is None:
+            row = len(self._rows)
+            if row == len(self._records):
+                self._records = np.resize(self._records, max(16, 2 * row))
+            self._rows[member.id] = row
+            self._intervals.append(None)
+        self._records[row] = record
+        self._intervals[row] = None if intervals is None else tuple(intervals)
+
+    def _unpack(self, id: int) -> None:
+        """Move the last row into the row of the removed member"""
+        row = self._rows.pop(id, None)
+        if row is None:
+            return
+        last = len(self._rows)
+        if row != last:
+            self._records[row] = self._records[last]
+            self._intervals[row] = self._intervals[last]
+            self._rows[int(self._records[row]["id"])] = row
+        self._intervals.pop()
+
+    def _snapshot(
+        self, dirty: Set[int]
+    ) -> Tuple[np.ndarray, List[Optional[Tuple[float, ...]]]]:
+        for id in dirty:
+            member = self._repository.get(id)
+            if member is None:
+                self._unpack(id)
+            else:
+                self._pack(member)
+        return self._records[: len(self._rows)], self._intervals
+
+    @asAsync
+    def _write(
+        self, snapshot: Tuple[np.ndarray, List[Optional[Tuple[float, ...]]]]
+    ) -> None:
+        records, intervals = snapshot
+        intervals = pack_intervals(records, intervals, self.interval_dtype)
+        write(self.file, records, intervals)
+
+
+if __name__ == "__main__":
+    # python -m services.binary_snapshot to-binary member_times.json member_times.bin
+    # python -m services.binary_snapshot to-json member_times.bin member_times.json
+    if len(sys.argv) != 4 or sys.argv[1] not in ("to-binary", "to-json"):
+        print(
+            "Usage: python -m services.binary_snapshot <to-binary|to-json> <source> <destination>"
+        )
+        sys.exit(1)
+    _, command, source, destination = sys.argv
+    if command == "to-binary":
+        with open(source, "r") as f:
+            data = json.load(f)
+        write(destination, *encode(data))
+    else:
+        data = member_time_dataclass_to_dict(decode(*read(source)))
+        with open(destination, "w") as f:
+            json.dump(data, f, indent=4)
+    print(f"Converted {len(data)} member(s)")
@@ -0,0 +1,145 @@
+from typing import Dict, Iterator, Optional
+from os import path
+import glob
+import os
+
+import discord
+
+from models.member_time import MemberTimeDataclass
+from services.active_sessions import ActiveSessions
+from services.binary_snapshot import BinaryMemberStorage
+from services.leaderboard import Leaderboard
+from services.member_storage import JsonMemberStorage, MemberStorage
+from services.member_store import MemberTimeRepository
+from services.session_journal import SessionJournal
+from services.sqlite_storage import SqliteMemberStorage
+from utils.logger import AppLogger
+
+MEMBER_FILES = {
+    "json": "member_times.json",
+    "sqlite": "member_times.db",
+    "binary": "member_times.bin",
+}
+JOURNAL_FILE = "member_sessions.jsonl"
+# Files written by the single guild version of the bot, next to main.py
+LEGACY_FILES = ("member_times.*", f"{JOURNAL_FILE}*")
+
+
+def create_storage(
+    backend: str, directory: str, flush_interval: float = 30
+) -> MemberStorage:
+    file = path.join(directory, MEMBER_FILES.get(backend, MEMBER_FILES["json"]))
+    if backend == "sqlite":
+        return SqliteMemberStorage(file, flush_interval=flush_interval)
+    if backend == "binary":
+        return BinaryMemberStorage(file, flush_interval=flush_interval)
+    return JsonMemberStorage(file, flush_interval=flush_interval)
+
+
+class GuildState:
+    """Tracked members of a single guild and everything persisted with them"""
+
+    def __init__(
+        self,
+        guild_id: int,
+        storage: MemberStorage,
+        journal_file: str,
+        compact_interval: float = 300,
+    ) -> None:
+        self.guild_id = guild_id
+        self.storage = storage
+        self.members = MemberTimeRepository(storage.load())
+        storage.bind(self.members)
+        self.journal = SessionJournal(
+            journal_file, storage, compact_interval=compact_interval
+        )
+        self.journal.replay(self.members)
+        self.sessions = ActiveSessions()
+        self.leaderboard = Leaderboard(self.members)
+
+    def get(self, id: int) -> Optional[MemberTimeDataclass]:
+        return self.members.get(id)
+
+    def save(self, member: MemberTimeDataclass, event: str) -> None:
+        self.journal.append(event, member)
+        self.storage.mark_dirty(member)
+        self.leaderboard.update(member)
+
+    async def close(self) -> None:
+        await self.journal.close()
+        await self.storage.close()
+
+
+class GuildStates:
+    """
+    State of every guild handled by this process, each one in its own
+    directory. A guild is loaded the first time it is seen, so with sharding
+    a process only loads and writes the guilds of its own shards.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        backend: str = "json",
+        flush_interval: float = 30,
+        compact_interval: float = 300,
+        legacy_guild_id: Optional[int] = None,
+    ) -> None:
+        self.logger = AppLogger().logger
+        self.directory = directory
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.legacy_guild_id = legacy_guild_id
+        self._states: Dict[int, GuildState] = {}
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __iter__(self) -> Iterator[GuildState]:
+        return iter(list(self._states.values()))
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._states
+
+    def get(self, guild: discord.Guild) -> GuildState:
+        state = self._states.get(guild.id)
+        if state is None:
+            state = self._load(guild.id)
+            self._states[guild.id] = state
+        return state
+
+    def _load(self, guild_id: int) -> GuildState:
+        directory = path.join(self.directory, str(guild_id))
+        if not path.isdir(directory):
+            os.makedirs(directory)
+            if guild_id == self.legacy_guild_id:
+                self._adopt_legacy_files(directory)
+        state = GuildState(
+            guild_id,
+            create_storage(self.backend, directory, self.flush_interval),
+            path.join(directory, JOURNAL_FILE),
+            compact_interval=self.compact_interval,
+        )
+        self.logger.info(
+            f"[{self.__class__.__name__}] Loaded {len(state.members)} member(s) of the guild {guild_id}"
+        )
+        return state
+
+    def _adopt_legacy_files(self, directory: str) -> None:
+        for pattern in LEGACY_FILES:
+            for file in glob.glob(pattern):
+                os.replace(file, path.join(directory, path.basename(file)))
+                self.logger.info(
+                    f"[{self.__class__.__name__}] Moved {file} into {directory}"
+                )
+
+    async def unload(self, guild_id: int) -> None:
+        """Persist and forget a guild that this process no longer handles"""
+        state = self._states.pop(guild_id, None)
+        if state is not None:
+            await state.close()
+
+    async def close(self) -> None:
+        for guild_id in list(self._states):
+            await self.unload(guild_id)
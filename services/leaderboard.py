@@ -0,0 +1,60 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from models.member_time import MemberTimeDataclass
+
+# (rank, member id, total minutes connected), ranks start at 1
+Entry = Tuple[int, int, float]
+
+
+class Leaderboard:
+    """
+    Members ranked by their total minutes connected, highest first.
+
+    Updates, rank lookups and pages are O(log n), the ranking is keyed on
+    (-minutes, id) so ties are stable.
+    """
+
+    def __init__(self, members: Iterable[MemberTimeDataclass] = ()) -> None:
+        self._minutes: Dict[int, float] = {
+            member.id: member.total_minutes_connected for member in members
+        }
+        self._ranking = SortedList((-minutes, id) for id, minutes in self._minutes.items())
+
+    def __len__(self) -> int:
+        return len(self._ranking)
+
+    def update(self, member: MemberTimeDataclass) -> None:
+        minutes = member.total_minutes_connected
+        previous = self._minutes.get(member.id)
+        if previous == minutes:
+            return
+        if previous is not None:
+            self._ranking.remove((-previous, member.id))
+        self._minutes[member.id] = minutes
+        self._ranking.add((-minutes, member.id))
+
+    def remove(self, id: int) -> None:
+        previous = self._minutes.pop(id, None)
+        if previous is not None:
+            self._ranking.remove((-previous, id))
+
+    def rank(self, id: int) -> Optional[int]:
+        minutes = self._minutes.get(id)
+        if minutes is None:
+            return None
+        return self._ranking.bisect_left((-minutes, id)) + 1
+
+    def top(self, count: int = 1) -> List[Entry]:
+        return self.page(1, count)
+
+    def page(self, page: int, size: int = 10) -> List[Entry]:
+        start = (page - 1) * size
+        return [
+            (start + i + 1, id, -minutes)
+            for i, (minutes, id) in enumerate(self._ranking.islice(start, start + size))
+        ]
+
+    def pages(self, size: int = 10) -> int:
+        return max((len(self._ranking) + size - 1) // size, 1)
@@ -0,0 +1,158 @@
+from abc import ABC, abstractmethod
+from typing import IO, Any, Callable, Dict, List, Optional, Set
+from os import path
+import asyncio
+import tempfile
+import json
+import os
+
+from models.member_time import (
+    MemberTimeDataclass,
+    member_time_dataclass_from_dict,
+)
+from services.member_store import MemberTimeRepository
+from utils.async_tools import asAsync
+from utils.logger import AppLogger
+
+
+def write_atomically(file: str, write: Callable[[IO], None], mode: str = "w") -> None:
+    """Write into a temporary file and rename it over the destination"""
+    directory = path.dirname(path.abspath(file))
+    fd, temp_file = tempfile.mkstemp(dir=directory, prefix=".member_times.")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file readable only by the owner
+        os.chmod(temp_file, 0o644)
+        os.replace(temp_file, file)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+class MemberStorage(ABC):
+    """
+    Write-behind persistence of the tracked members.
+
+    Changes are only marked as dirty, every change received inside the flush
+    interval is coalesced into a single write that runs outside of the event
+    loop. Backends implement how the members are loaded, which snapshot of the
+    dirty members is taken on the loop and how it is written.
+    """
+
+    def __init__(self, file: str, flush_interval: float = 30) -> None:
+        self.logger = AppLogger().logger
+        self.file = file
+        self.flush_interval = flush_interval
+        self._repository: Optional[MemberTimeRepository] = None
+        self._dirty: Set[int] = set()
+        self._pending_flush: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @abstractmethod
+    def load(self) -> List[MemberTimeDataclass]:
+        ...
+
+    @abstractmethod
+    def _snapshot(self, dirty: Set[int]) -> Any:
+        ...
+
+    @abstractmethod
+    async def _write(self, snapshot: Any) -> None:
+        ...
+
+    def bind(self, repository: MemberTimeRepository) -> None:
+        """Set the repository that is persisted on every flush"""
+        self._repository = repository
+
+    @property
+    def dirty(self) -> bool:
+        return len(self._dirty) != 0
+
+    def mark_dirty(self, member: MemberTimeDataclass) -> None:
+        self._dirty.add(member.id)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Marked while loading, it is written with the next flush
+            return
+        if self._pending_flush is None or self._pending_flush.done():
+            self._pending_flush = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        # From here on the flush must not be cancelled by close()
+        self._pending_flush = None
+        await self.flush()
+
+    async def flush(self) -> bool:
+        """Write the pending changes, returns whether the storage is up to date"""
+        async with self._lock:
+            if self._repository is None:
+                return False
+            if not self.dirty:
+                return True
+            dirty, self._dirty = self._dirty, set()
+            try:
+                # The snapshot is taken on the loop so it is consistent, only
+                # the serialization and the disk access go to the executor
+                snapshot = self._snapshot(dirty)
+                await self._write(snapshot)
+            except Exception as e:
+                # Kept dirty, the next flush tries them again
+                self.logger.error(f"[{self.__class__.__name__}] Flush failed {e}")
+                self._dirty |= dirty
+                return False
+            except asyncio.CancelledError:
+                self._dirty |= dirty
+                raise
+            self.logger.debug(
+                f"[{self.__class__.__name__}] Flushed {len(dirty)} changed member(s)"
+            )
+            return True
+
+    async def close(self) -> bool:
+        if self._pending_flush is not None and not self._pending_flush.done():
+            self._pending_flush.cancel()
+        return await self.flush()
+
+
+class JsonMemberStorage(MemberStorage):
+    """
+    Stores every member in a json file that is replaced atomically.
+
+    The json form of every member is kept and only the dirty members are
+    converted again on a flush, the whole file is dumped in the executor.
+    """
+
+    def __init__(self, file: str, flush_interval: float = 30) -> None:
+        super().__init__(file, flush_interval)
+        # Never mutated, a refreshed member gets a new dict, so the executor
+        # can dump them while the loop refreshes others
+        self._dicts: Dict[int, Dict[str, Any]] = {}
+
+    def load(self) -> List[MemberTimeDataclass]:
+        if not path.exists(self.file):
+            return []
+        with open(self.file, "r") as f:
+            return member_time_dataclass_from_dict(json.load(f))
+
+    def bind(self, repository: MemberTimeRepository) -> None:
+        super().bind(repository)
+        self._dicts = {member.id: member.to_dict() for member in repository}
+
+    def _snapshot(self, dirty: Set[int]) -> List[Any]:
+        for id in dirty:
+            member = self._repository.get(id)
+            if member is None:
+                self._dicts.pop(id, None)
+            else:
+                self._dicts[id] = member.to_dict()
+        # The file always holds every member, not only the dirty ones
+        return list(self._dicts.values())
+
+    @asAsync
+    def _write(self, snapshot: List[Any]) -> None:
+        write_atomically(self.file, lambda f: json.dump(snapshot, fp=f))
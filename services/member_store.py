@@ -0,0 +1,51 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from models.member_time import MemberTimeDataclass
+
+
+class MemberTimeRepository:
+    """In-memory store of tracked members indexed by their discord id"""
+
+    def __init__(self, members: Iterable[MemberTimeDataclass] = ()) -> None:
+        self._members: Dict[int, MemberTimeDataclass] = {}
+        for member in members:
+            # Older files may contain duplicated entries, the last one wins
+            # like it did with the previous list lookups
+            self._members[member.id] = member
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __iter__(self) -> Iterator[MemberTimeDataclass]:
+        return iter(self._members.values())
+
+    def __contains__(self, id: int) -> bool:
+        return id in self._members
+
+    def contains(self, id: int) -> bool:
+        return id in self._members
+
+    def get(self, id: int) -> Optional[MemberTimeDataclass]:
+        return self._members.get(id)
+
+    def add(self, member: MemberTimeDataclass) -> MemberTimeDataclass:
+        if member.id in self._members:
+            raise KeyError(f"Member {member.id} is already tracked")
+        self._members[member.id] = member
+        return member
+
+    def update(self, member: MemberTimeDataclass) -> MemberTimeDataclass:
+        if member.id not in self._members:
+            raise KeyError(f"Member {member.id} is not tracked")
+        self._members[member.id] = member
+        return member
+
+    def upsert(self, member: MemberTimeDataclass) -> MemberTimeDataclass:
+        self._members[member.id] = member
+        return member
+
+    def remove(self, id: int) -> Optional[MemberTimeDataclass]:
+        return self._members.pop(id, None)
+
+    def to_list(self) -> List[MemberTimeDataclass]:
+        return list(self._members.values())
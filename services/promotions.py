@@ -0,0 +1,188 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Set, Tuple
+import asyncio
+import random
+import time
+
+import discord
+
+from utils.logger import AppLogger
+
+
+async def swap_role(
+    member: discord.Member,
+    old_role: discord.Role,
+    new_role: discord.Role,
+    reason: Optional[str] = None,
+) -> None:
+    """Replace one role of the member with a single request"""
+    roles = [
+        role
+        for role in member.roles
+        if not role.is_default() and role.id != old_role.id
+    ]
+    if new_role not in roles:
+        roles.append(new_role)
+    await member.edit(roles=roles, reason=reason)
+
+
+@dataclass
+class Promotion:
+    guild: discord.Guild
+    member_id: int
+    from_role_id: int
+    to_role_id: int
+    reason: str
+    notify: bool = True
+    # Called once the role was swapped, to record what the promotion consumed
+    on_applied: Optional[Callable[[], None]] = None
+
+
+class PromotionScheduler:
+    """
+    Applies role promotions outside of the voice events.
+
+    Every guild has its own queue and worker, requests of a guild are spaced
+    by the configured rate and retried with an exponential backoff when
+    discord answers with 429 or a server error. A member only has a single
+    pending promotion in every guild, scheduling another one replaces its
+    target role while it is queued and is ignored while it is applied.
+    Promotions that are never applied, because of a missing member or role,
+    failed retries or a close with queued promotions, do not call their
+    on_applied callback and can be scheduled again. A promotion refused by
+    discord, like a role above the bot, is not scheduled again for the
+    member until failure_backoff seconds passed, doubled on every refusal.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 1,
+        max_retries: int = 5,
+        backoff: float = 1,
+        failure_backoff: float = 3600,
+        max_failure_backoff: float = 24 * 3600,
+    ) -> None:
+        self.logger = AppLogger().logger
+        # A rate of 0 or less does not space the requests
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.failure_backoff = failure_backoff
+        self.max_failure_backoff = max_failure_backoff
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        # A member of several guilds has a promotion pending in each of them
+        self._pending: Dict[Tuple[int, int], Promotion] = {}
+        # Promotions being applied, they stay pending until it finishes
+        self._applying: Set[Tuple[int, int]] = set()
+        # Refused promotions, their count and when they can be scheduled again
+        self._refused: Dict[Tuple[int, int], Tuple[int, float]] = {}
+
+    def is_pending(self, guild_id: int, member_id: int) -> bool:
+        return (guild_id, member_id) in self._pending
+
+    def is_held(self, guild_id: int, member_id: int) -> bool:
+        """Whether a promotion of the member would not be scheduled now"""
+        key = (guild_id, member_id)
+        return key in self._pending or self._is_refused(key)
+
+    def _is_refused(self, key: Tuple[int, int]) -> bool:
+        refused = self._refused.get(key)
+        return refused is not None and time.monotonic() < refused[1]
+
+    def schedule(self, promotion: Promotion) -> None:
+        guild_id = promotion.guild.id
+        key = (guild_id, promotion.member_id)
+        if key in self._applying or self._is_refused(key):
+            return
+        already_queued = key in self._pending
+        self._pending[key] = promotion
+        if already_queued:
+            return
+        if guild_id not in self._queues:
+            self._queues[guild_id] = asyncio.Queue()
+        self._queues[guild_id].put_nowait(promotion.member_id)
+        worker = self._workers.get(guild_id)
+        if worker is None or worker.done():
+            self._workers[guild_id] = asyncio.create_task(self._work(guild_id))
+
+    async def _work(self, guild_id: int) -> None:
+        queue = self._queues[guild_id]
+        while True:
+            member_id = await queue.get()
+            key = (guild_id, member_id)
+            promotion = self._pending.get(key)
+            if promotion is None:
+                continue
+            self._applying.add(key)
+            try:
+                await self._apply(promotion)
+                self._refused.pop(key, None)
+            except Exception as e:
+                if isinstance(e, discord.HTTPException) and (
+                    e.status != 429 and e.status < 500
+                ):
+                    self._refuse(key)
+                self.logger.error(
+                    f"[{self.__class__.__name__}] Promotion of {member_id} failed {e}"
+                )
+            finally:
+                self._applying.discard(key)
+                self._pending.pop(key, None)
+            await asyncio.sleep(self.interval)
+
+    def _refuse(self, key: Tuple[int, int]) -> None:
+        count = self._refused.get(key, (0, 0))[0] + 1
+        delay = min(self.failure_backoff * 2 ** (count - 1), self.max_failure_backoff)
+        self._refused[key] = (count, time.monotonic() + delay)
+        self.logger.warning(
+            f"[{self.__class__.__name__}] Promotion of {key[1]} refused {count} time(s), not scheduled again for {delay:.0f}s"
+        )
+
+    async def _apply(self, promotion: Promotion) -> None:
+        guild = promotion.guild
+        member = guild.get_member(promotion.member_id)
+        from_role = guild.get_role(promotion.from_role_id)
+        to_role = guild.get_role(promotion.to_role_id)
+        if member is None or from_role is None or to_role is None:
+            self.logger.warning(
+                f"[{self.__class__.__name__}] Member or role of the promotion of {promotion.member_id} no longer exists"
+            )
+            return
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                await swap_role(member, from_role, to_role, reason=promotion.reason)
+                break
+            except discord.HTTPException as e:
+                if (e.status != 429 and e.status < 500) or attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2**attempt * (1 + random.random())
+                self.logger.warning(
+                    f"[{self.__class__.__name__}] Promotion of {member.name} got {e.status}, retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+        self.logger.info(
+            f"[{self.__class__.__name__}] {member.name} promoted from {from_role.name} to {to_role.name}"
+        )
+        if promotion.on_applied is not None:
+            promotion.on_applied()
+        if promotion.notify and member.can_send():
+            try:
+                await member.send(
+                    f"Hello, you are now elegible to the role of `{to_role.name}`. Congratulations!"
+                )
+            except discord.HTTPException as e:
+                # The promotion was applied, only the message is lost
+                self.logger.warning(
+                    f"[{self.__class__.__name__}] Could not notify {member.name} {e}"
+                )
+
+    async def close(self) -> None:
+        if self._pending:
+            self.logger.warning(
+                f"[{self.__class__.__name__}] {len(self._pending)} promotion(s) not applied, they are checked again on the next start"
+            )
+        for worker in self._workers.values():
+            worker.cancel()
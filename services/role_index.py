@@ -0,0 +1,76 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import discord
+
+from services.role_intervals import geometric_table
+
+
+class RoleLadder:
+    """
+    Roles of a guild in hierarchy order, the first one is the lowest role.
+    Members climb it one position at a time, like they did over guild.roles.
+    """
+
+    def __init__(self, guild: discord.Guild) -> None:
+        self.guild_id = guild.id
+        self.roles: Tuple[discord.Role, ...] = tuple(guild.roles)
+        self.ranks: Dict[int, int] = {role.id: i for i, role in enumerate(self.roles)}
+        self._intervals: Optional[List[List[float]]] = None
+
+    def __len__(self) -> int:
+        return len(self.roles)
+
+    def __contains__(self, role: discord.Role) -> bool:
+        return role.id in self.ranks
+
+    def rank(self, role: discord.Role) -> int:
+        return self.ranks[role.id]
+
+    def is_highest(self, role: discord.Role) -> bool:
+        return self.ranks[role.id] == len(self.roles) - 1
+
+    def above(self, role: discord.Role, steps: int = 1) -> Optional[discord.Role]:
+        index = self.ranks[role.id] + steps
+        return self.roles[index] if 0 <= index < len(self.roles) else None
+
+    def below(self, role: discord.Role, steps: int = 1) -> Optional[discord.Role]:
+        return self.above(role, -steps)
+
+    def intervals(self, index: int) -> List[float]:
+        """Expected intervals of a member whose highest role is at the index"""
+        # Members consume their intervals, so each one gets its own list
+        return list(self._interval_table()[index])
+
+    def bulk_intervals(self, indexes: Sequence[int]) -> List[List[float]]:
+        table = self._interval_table()
+        return [list(table[index]) for index in indexes]
+
+    def _interval_table(self) -> List[List[float]]:
+        if self._intervals is None:
+            self._intervals = geometric_table(len(self.roles))
+        return self._intervals
+
+
+class RoleRankIndex:
+    """Role ladders of every guild, rebuilt only after the roles change"""
+
+    def __init__(self) -> None:
+        self._ladders: Dict[int, RoleLadder] = {}
+
+    def ladder(self, guild: discord.Guild) -> RoleLadder:
+        ladder = self._ladders.get(guild.id)
+        if ladder is None:
+            ladder = RoleLadder(guild)
+            self._ladders[guild.id] = ladder
+        return ladder
+
+    def ladder_of(self, role: discord.Role) -> RoleLadder:
+        """Ladder that contains the role, rebuilt if a role event was missed"""
+        ladder = self.ladder(role.guild)
+        if role not in ladder:
+            self.invalidate(role.guild.id)
+            ladder = self.ladder(role.guild)
+        return ladder
+
+    def invalidate(self, guild_id: int) -> None:
+        self._ladders.pop(guild_id, None)
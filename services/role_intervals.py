@@ -0,0 +1,30 @@
+from typing import List
+
+import numpy as np
+
+STARTING_MINUTES_REQUIRED = 200 * 60  # Hours * min = Total Min
+# 2 years * days * hours * minutes = Total in minutes
+TOTAL_MINUTES_TO_MAX_ROLE = 2 * 365 * 24 * 60
+
+
+def geometric_table(
+    roles: int,
+    start: float = STARTING_MINUTES_REQUIRED,
+    stop: float = TOTAL_MINUTES_TO_MAX_ROLE,
+) -> List[List[float]]:
+    """
+    Row i holds np.geomspace(start, stop, roles - i), the intervals of a member
+    whose highest role is at position i. Every row is computed in one pass.
+    """
+    if roles == 0:
+        return []
+    points = roles - np.arange(roles)[:, np.newaxis]
+    steps = np.arange(roles)[np.newaxis, :]
+    # Steps past the end of a row are clipped, they are dropped below anyway
+    exponents = np.minimum(steps, points - 1) / np.maximum(points - 1, 1)
+    table = start * (stop / start) ** exponents
+    # Same exact endpoints as np.geomspace
+    table[:, 0] = start
+    table[np.arange(roles - 1), points[:-1, 0] - 1] = stop
+    return [row[:count].tolist() for row, count in zip(table, points[:, 0])]
+
@@ -0,0 +1,142 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from os import path
+import asyncio
+import json
+import os
+
+from models.member_time import MemberTimeDataclass
+from services.member_storage import MemberStorage
+from services.member_store import MemberTimeRepository
+from utils.async_tools import asAsync
+from utils.logger import AppLogger
+
+
+class SessionJournal:
+    """
+    Append-only, line-delimited journal of the voice session events.
+
+    Every event is a single json line holding the event name, when it
+    happened and the member record after the change, so replaying the journal
+    is idempotent. The compactor flushes the storage snapshot and records in a
+    checkpoint file up to which byte the journal is already part of the
+    snapshot; recovery only replays the lines after it. Compacted journals are
+    rotated, like the log files, so the session history stays available.
+    """
+
+    def __init__(
+        self,
+        file: str,
+        storage: MemberStorage,
+        compact_interval: float = 300,
+        max_bytes: int = 32 * 1024 * 1024,  # 32 MiB
+        backup_count: int = 5,
+    ) -> None:
+        self.logger = AppLogger().logger
+        self.file = file
+        self.checkpoint_file = f"{file}.checkpoint"
+        self.storage = storage
+        self.compact_interval = compact_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._stream = open(self.file, "ab")
+        self._checkpoint = self._read_checkpoint()
+        self._compactor: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def offset(self) -> int:
+        return self._stream.tell()
+
+    def append(
+        self, event: str, member: MemberTimeDataclass, at: Optional[datetime] = None
+    ) -> None:
+        record: Dict[str, Any] = {
+            "event": event,
+            "at": (at or datetime.now()).isoformat(),
+            "member": member.to_dict(),
+        }
+        self._stream.write(json.dumps(record).encode("utf-8") + b"\n")
+        self._stream.flush()
+        self._ensure_compactor()
+
+    def replay(self, repository: MemberTimeRepository) -> int:
+        """Apply the journal lines that are not part of the snapshot yet"""
+        replayed = 0
+        with open(self.file, "rb") as f:
+            f.seek(self._checkpoint)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash in the middle of an append leaves a partial line
+                    self.logger.warning(
+                        f"[{self.__class__.__name__}] Skipping corrupted journal line"
+                    )
+                    continue
+                member = MemberTimeDataclass.from_dict(record["member"])
+                repository.upsert(member)
+                self.storage.mark_dirty(member)
+                replayed += 1
+        self.logger.info(
+            f"[{self.__class__.__name__}] Replayed {replayed} journal event(s)"
+        )
+        return replayed
+
+    def _read_checkpoint(self) -> int:
+        if not path.exists(self.checkpoint_file):
+            return 0
+        with open(self.checkpoint_file, "r") as f:
+            offset = json.load(f)["offset"]
+        # The journal was rotated after the checkpoint was written
+        return offset if offset <= path.getsize(self.file) else 0
+
+    def _ensure_compactor(self) -> None:
+        if self._compactor is None or self._compactor.done():
+            self._compactor = asyncio.create_task(self._compact_periodically())
+
+    async def _compact_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            # Cancelling the compactor must not interrupt a compaction halfway
+            await asyncio.shield(self.compact())
+
+    async def compact(self) -> None:
+        """Fold the journal into the storage snapshot and move the checkpoint"""
+        async with self._lock:
+            # Taken before flushing, the snapshot will contain at least
+            # everything until here. Replaying a few lines twice is harmless.
+            offset = self.offset
+            if offset == self._checkpoint:
+                return
+            if not await self.storage.flush():
+                return
+            await self._write_checkpoint(offset)
+            self._checkpoint = offset
+            if offset == self.offset and offset >= self.max_bytes:
+                self._rotate()
+                await self._write_checkpoint(0)
+                self._checkpoint = 0
+
+    @asAsync
+    def _write_checkpoint(self, offset: int) -> None:
+        temp_file = f"{self.checkpoint_file}.tmp"
+        with open(temp_file, "w") as f:
+            json.dump({"offset": offset}, f)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def _rotate(self) -> None:
+        self._stream.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.file}.{i}"
+            if path.exists(source):
+                os.replace(source, f"{self.file}.{i + 1}")
+        os.replace(self.file, f"{self.file}.1")
+        self._stream = open(self.file, "ab")
+        self.logger.info(f"[{self.__class__.__name__}] Journal rotated")
+
+    async def close(self) -> None:
+        if self._compactor is not None and not self._compactor.done():
+            self._compactor.cancel()
+        await self.compact()
+        self._stream.close()
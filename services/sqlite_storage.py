@@ -0,0 +1,149 @@
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Set, Tuple
+import sqlite3
+import sys
+
+from models.member_time import (
+    MemberTimeDataclass,
+    from_optional_datetime,
+    share_intervals,
+)
+from services.member_storage import JsonMemberStorage, MemberStorage
+from utils.async_tools import asAsync
+
+Row = Tuple[Any, ...]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    highest_role_id INTEGER,
+    connected_at TEXT,
+    disconnected_at TEXT,
+    last_connected_at TEXT,
+    last_connected_by REAL,
+    expected_exponential_intervals BLOB,
+    total_minutes_connected REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS members_total_minutes_connected
+    ON members (total_minutes_connected);
+"""
+
+UPSERT = """
+INSERT INTO members (
+    id, name, highest_role_id, connected_at, disconnected_at, last_connected_at,
+    last_connected_by, expected_exponential_intervals, total_minutes_connected
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    name = excluded.name,
+    highest_role_id = excluded.highest_role_id,
+    connected_at = excluded.connected_at,
+    disconnected_at = excluded.disconnected_at,
+    last_connected_at = excluded.last_connected_at,
+    last_connected_by = excluded.last_connected_by,
+    expected_exponential_intervals = excluded.expected_exponential_intervals,
+    total_minutes_connected = excluded.total_minutes_connected
+"""
+
+SELECT = """
+SELECT
+    id, name, highest_role_id, connected_at, disconnected_at, last_connected_at,
+    last_connected_by, expected_exponential_intervals, total_minutes_connected
+FROM members
+"""
+
+
+def to_row(member: MemberTimeDataclass) -> Row:
+    last_connected_by = member.last_connected_by
+    if isinstance(last_connected_by, timedelta):
+        last_connected_by = last_connected_by.total_seconds()
+    intervals = member.expected_exponential_intervals
+    return (
+        member.id,
+        member.name,
+        member.highest_role_id,
+        to_iso(member.connected_at),
+        to_iso(member.disconnected_at),
+        to_iso(member.last_connected_at),
+        last_connected_by,
+        # Intervals are kept as a packed float64 array, NULL means not calculated
+        array("d", intervals).tobytes() if intervals is not None else None,
+        member.total_minutes_connected,
+    )
+
+
+def from_row(row: Row) -> MemberTimeDataclass:
+    return MemberTimeDataclass(
+        id=row[0],
+        name=row[1],
+        highest_role_id=row[2],
+        connected_at=from_optional_datetime(row[3]),
+        disconnected_at=from_optional_datetime(row[4]),
+        last_connected_at=from_optional_datetime(row[5]),
+        last_connected_by=row[6],
+        expected_exponential_intervals=(
+            array("d", row[7]).tolist() if row[7] is not None else None
+        ),
+        total_minutes_connected=row[8],
+    )
+
+
+def to_iso(x: Optional[datetime]) -> Optional[str]:
+    return x.isoformat() if x is not None else None
+
+
+class SqliteMemberStorage(MemberStorage):
+    """
+    Stores the members in a SQLite database in WAL mode.
+
+    Only the rows of the dirty members are upserted, in a single transaction
+    per flush, so the cost of a flush depends on the changes and not on the
+    size of the guild.
+    """
+
+    def __init__(self, file: str, flush_interval: float = 30) -> None:
+        super().__init__(file, flush_interval)
+        # Every access after the startup happens in the executor, serialized by
+        # the flush lock
+        self._connection = sqlite3.connect(self.file, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def load(self) -> List[MemberTimeDataclass]:
+        return share_intervals(
+            [from_row(row) for row in self._connection.execute(SELECT)]
+        )
+
+    def _snapshot(self, dirty: Set[int]) -> List[Row]:
+        members = (self._repository.get(id) for id in dirty)
+        return [to_row(member) for member in members if member is not None]
+
+    @asAsync
+    def _write(self, snapshot: List[Row]) -> None:
+        self._write_rows(snapshot)
+
+    def _write_rows(self, rows: List[Row]) -> None:
+        with self._connection:
+            self._connection.executemany(UPSERT, rows)
+
+    def migrate_from_json(self, json_file: str) -> int:
+        """Import every member of a json member file, returns how many"""
+        members = JsonMemberStorage(json_file).load()
+        self._write_rows([to_row(member) for member in members])
+        return len(members)
+
+    async def close(self) -> bool:
+        flushed = await super().close()
+        self._connection.close()
+        return flushed
+
+
+if __name__ == "__main__":
+    # python -m services.sqlite_storage member_times.json member_times.db
+    if len(sys.argv) != 3:
+        print("Usage: python -m services.sqlite_storage <json file> <database>")
+        sys.exit(1)
+    storage = SqliteMemberStorage(sys.argv[2])
+    print(f"Imported {storage.migrate_from_json(sys.argv[1])} member(s)")
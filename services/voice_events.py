@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+
+import discord
+
+from utils.logger import AppLogger
+
+# Applies the net connection change of a member, connected or not, and when
+VoiceChangeHandler = Callable[[discord.Member, bool, datetime], Awaitable[None]]
+
+
+@dataclass(slots=True)
+class PendingVoiceChange:
+    member: discord.Member
+    was_connected: bool
+    connected: bool
+    at: datetime
+    task: Optional[asyncio.Task] = None
+
+
+class VoiceEventCoalescer:
+    """
+    Holds the joins and leaves of every member for a short window and only
+    applies the net change once the window is over.
+
+    A client that disconnects and reconnects inside the window ends where it
+    started, so nothing is applied and its session goes on as a single one.
+    Windows start with the first event of the member and are not extended by
+    the following ones, a member that keeps flapping is still applied.
+    """
+
+    def __init__(self, apply: VoiceChangeHandler, window: float = 5) -> None:
+        self.logger = AppLogger().logger
+        self.window = window
+        self._apply_change = apply
+        self._pending: Dict[Tuple[int, int], PendingVoiceChange] = {}
+        self.received = 0
+        self.applied = 0
+
+    @property
+    def coalesced(self) -> int:
+        return self.received - self.applied - len(self._pending)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def push(self, member: discord.Member, connected: bool) -> None:
+        self.received += 1
+        now = datetime.now()
+        if self.window <= 0:
+            await self._apply(PendingVoiceChange(member, not connected, connected, now))
+            return
+        key = (member.guild.id, member.id)
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.member = member
+            pending.connected = connected
+            pending.at = now
+            return
+        pending = PendingVoiceChange(member, not connected, connected, now)
+        pending.task = asyncio.create_task(self._apply_later(key))
+        self._pending[key] = pending
+
+    async def _apply_later(self, key: Tuple[int, int]) -> None:
+        await asyncio.sleep(self.window)
+        await self._apply(self._pending.pop(key))
+
+    async def _apply(self, pending: PendingVoiceChange) -> None:
+        if pending.connected == pending.was_connected:
+            self.logger.debug(
+                f"[{self.__class__.__name__}] Voice events of {pending.member.name} cancelled each other"
+            )
+            return
+        self.applied += 1
+        try:
+            await self._apply_change(pending.member, pending.connected, pending.at)
+        except Exception as e:
+            self.logger.error(
+                f"[{self.__class__.__name__}] Voice change of {pending.member.name} failed {e}"
+            )
+
+    async def flush(self) -> None:
+        """Apply every pending change now, without waiting for its window"""
+        for key in list(self._pending):
+            pending = self._pending.pop(key)
+            pending.task.cancel()
+            await self._apply(pending)
@@ -0,0 +1,151 @@
+"""
+Local stand-in of the OpenAI completions and chat completions endpoints,
+to try the bot, the tests or the benchmarks without the real API. Chat
+completions echo the last message, word by word as server-sent events when
+streamed.
+
+Run from the project root:
+python -m tests.stub_openai_server [port] [delay] [token delay]
+and set OPEN_AI_BASE_URL=http://localhost:<port>/v1
+"""
+from typing import Set, Tuple
+import asyncio
+import json
+import sys
+import time
+
+from aiohttp import web
+
+Peer = Tuple[str, int]
+
+
+def usage(prompt: str, completion: str) -> dict:
+    prompt_tokens = len(prompt.split())
+    completion_tokens = len(completion.split())
+    return {
+        "completion_tokens": completion_tokens,
+        "prompt_tokens": prompt_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def create_app(
+    delay: float = 0.1, token_delay: float = 0, failures: int = 0
+) -> web.Application:
+    """
+    Answers take delay seconds plus token_delay seconds per word, the first
+    failures requests are answered with 429
+    """
+    app = web.Application()
+    # Client connections seen, one per connection when they are kept alive
+    app["peers"] = set()
+    # Counters changed while the server runs
+    app["stats"] = {"requests": 0, "failures": failures}
+
+    def track(request: web.Request) -> None:
+        peers: Set[Peer] = app["peers"]
+        peers.add(request.transport.get_extra_info("peername"))
+        app["stats"]["requests"] += 1
+
+    async def stream_chat_completions(
+        request: web.Request, payload: dict, content: str
+    ) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(delay)
+        for i, word in enumerate(content.split(" ")):
+            await asyncio.sleep(token_delay)
+            chunk = {
+                "choices": [
+                    {
+                        "delta": {"content": word if i == 0 else f" {word}"},
+                        "finish_reason": None,
+                        "index": 0,
+                    }
+                ],
+                "created": int(time.time()),
+                "id": f"chatcmpl-{app['stats']['requests']}",
+                "model": payload["model"],
+                "object": "chat.completion.chunk",
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    def rate_limited() -> bool:
+        stats = app["stats"]
+        if stats["failures"] <= 0:
+            return False
+        stats["failures"] -= 1
+        return True
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        track(request)
+        if rate_limited():
+            return web.json_response({"error": "rate limited"}, status=429)
+        payload = await request.json()
+        last = payload["messages"][-1]["content"]
+        content = f"Echo: {last}"
+        if payload.get("stream"):
+            return await stream_chat_completions(request, payload, content)
+        await asyncio.sleep(delay + token_delay * len(content.split(" ")))
+        return web.json_response(
+            {
+                "choices": [
+                    {
+                        "finish_reason": "stop",
+                        "index": 0,
+                        "message": {"content": content, "role": "assistant"},
+                    }
+                ],
+                "created": int(time.time()),
+                "id": f"chatcmpl-{app['stats']['requests']}",
+                "model": payload["model"],
+                "object": "chat.completion",
+                "usage": usage(
+                    " ".join(m["content"] for m in payload["messages"]), content
+                ),
+            }
+        )
+
+    async def completions(request: web.Request) -> web.Response:
+        track(request)
+        if rate_limited():
+            return web.json_response({"error": "rate limited"}, status=429)
+        payload = await request.json()
+        await asyncio.sleep(delay)
+        text = f"Echo: {payload['prompt']}"
+        return web.json_response(
+            {
+                "choices": [
+                    {"finish_reason": "stop", "index": 0, "logprobs": None, "text": text}
+                ],
+                "created": int(time.time()),
+                "id": f"cmpl-{app['stats']['requests']}",
+                "model": payload["model"],
+                "object": "text_completion",
+                "usage": usage(payload["prompt"], text),
+            }
+        )
+
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/completions", completions)
+    return app
+
+
+async def serve(app: web.Application) -> Tuple[web.AppRunner, str]:
+    """Start the app on a free local port, returns its runner and base url"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}/v1"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    token_delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    web.run_app(create_app(delay, token_delay), port=port)
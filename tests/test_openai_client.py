@@ -0,0 +1,106 @@
+"""
+OpenAiClient against the local stub server.
+
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+import unittest
+
+from modules.openai_client import OpenAiClient, OpenAiError
+from tests.stub_openai_server import create_app, serve
+
+MESSAGES = [{"role": "user", "content": "hello there"}]
+
+
+class OpenAiClientTest(unittest.IsolatedAsyncioTestCase):
+    async def start_server(
+        self, timeout: float = 60, model_concurrency: int = 4, **options
+    ) -> OpenAiClient:
+        self.app = create_app(delay=0, **options)
+        runner, base_url = await serve(self.app)
+        self.addAsyncCleanup(runner.cleanup)
+        client = OpenAiClient(
+            "key",
+            base_url,
+            timeout=timeout,
+            model_concurrency=model_concurrency,
+            backoff=0,
+        )
+        self.addAsyncCleanup(client.close)
+        return client
+
+    async def test_chat_completion(self):
+        client = await self.start_server()
+        response = await client.chat_completions(model="model", messages=MESSAGES)
+        self.assertEqual(
+            response["choices"][0]["message"]["content"], "Echo: hello there"
+        )
+        self.assertEqual(response["usage"]["prompt_tokens"], 2)
+        self.assertEqual(self.app["stats"]["requests"], 1)
+
+    async def test_error_status_raises(self):
+        client = await self.start_server()
+        with self.assertRaises(OpenAiError) as raised:
+            await client.post("/missing", {"model": "model"})
+        self.assertEqual(raised.exception.status, 404)
+        self.assertEqual(client.retries, 0)
+
+    async def test_retries_exhausted_raise(self):
+        client = await self.start_server(failures=2)
+        client.max_retries = 1
+        with self.assertRaises(OpenAiError) as raised:
+            await client.chat_completions(model="model", messages=MESSAGES)
+        self.assertEqual(raised.exception.status, 429)
+        self.assertEqual(self.app["stats"]["requests"], 2)
+
+    async def test_rate_limited_request_is_retried(self):
+        client = await self.start_server(failures=2)
+        response = await client.chat_completions(model="model", messages=MESSAGES)
+        self.assertEqual(
+            response["choices"][0]["message"]["content"], "Echo: hello there"
+        )
+        self.assertEqual(client.retries, 2)
+        self.assertEqual(self.app["stats"]["requests"], 3)
+
+    async def test_streamed_deltas(self):
+        client = await self.start_server()
+        deltas = [
+            delta
+            async for delta in client.stream_chat_completions(
+                model="model", messages=MESSAGES
+            )
+        ]
+        self.assertEqual(deltas, ["Echo:", " hello", " there"])
+
+    async def test_stream_outlives_the_total_timeout(self):
+        # 16 deltas 0.05s apart, longer than the timeout of a request
+        client = await self.start_server(timeout=0.5, token_delay=0.05)
+        messages = [{"role": "user", "content": " ".join(["word"] * 15)}]
+        deltas = [
+            delta
+            async for delta in client.stream_chat_completions(
+                model="model", messages=messages
+            )
+        ]
+        self.assertEqual(len(deltas), 16)
+
+    async def test_closed_stream_releases_its_slot(self):
+        client = await self.start_server(model_concurrency=1)
+        deltas = client.stream_chat_completions(model="model", messages=MESSAGES)
+        await deltas.__anext__()
+        await deltas.aclose()
+        response = await asyncio.wait_for(
+            client.chat_completions(model="model", messages=MESSAGES), 1
+        )
+        self.assertEqual(
+            response["choices"][0]["message"]["content"], "Echo: hello there"
+        )
+
+    async def test_completion(self):
+        client = await self.start_server()
+        response = await client.completions(model="model", prompt="hi")
+        self.assertEqual(response["choices"][0]["text"], "Echo: hi")
+
+
+if __name__ == "__main__":
+    unittest.main()
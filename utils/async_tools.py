@@ -1,10 +1,170 @@
-import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
 from functools import wraps, partial
+import asyncio
+import importlib
+import os
+import time
+
+from decouple import config
+
+
+@dataclass
+class PoolMetrics:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    cancelled: int = 0
+    # Seconds between the submission and the start of the calls
+    total_wait: float = 0
+    max_wait: float = 0
+
+    @property
+    def in_flight(self) -> int:
+        finished = self.completed + self.failed + self.timed_out + self.cancelled
+        return self.submitted - finished
+
+    @property
+    def mean_wait(self) -> float:
+        # Only the completed calls report when they started
+        return self.total_wait / self.completed if self.completed else 0
+
+
+@dataclass
+class ExecutorPool:
+    """An executor created on first use, with the metrics of its calls"""
+
+    name: str
+    factory: Callable[[int], Executor]
+    max_workers: int
+    # Process pools run the functions by their import path
+    processes: bool = False
+    metrics: PoolMetrics = field(default_factory=PoolMetrics)
+    executor: Optional[Executor] = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls submitted that are waiting for a free worker"""
+        return max(self.metrics.in_flight - self.max_workers, 0)
+
+    def get_executor(self) -> Executor:
+        if self.executor is None:
+            self.executor = self.factory(self.max_workers)
+        return self.executor
+
+    def record_start(self, submitted_at: float, started_at: float) -> None:
+        wait = max(started_at - submitted_at, 0)
+        self.metrics.total_wait += wait
+        self.metrics.max_wait = max(self.metrics.max_wait, wait)
+
+
+def thread_pool(name: str) -> Callable[[int], Executor]:
+    return partial(ThreadPoolExecutor, thread_name_prefix=f"{name}-pool")
+
+
+POOLS: Dict[str, ExecutorPool] = {
+    # Network and disk calls
+    "io": ExecutorPool(
+        "io", thread_pool("io"), config("ASYNC_IO_WORKERS", default=16, cast=int)
+    ),
+    # CPU bound work like transcriptions, the functions and their arguments
+    # must be importable and picklable
+    "cpu": ExecutorPool(
+        "cpu",
+        ProcessPoolExecutor,
+        config("ASYNC_CPU_WORKERS", default=os.cpu_count() or 1, cast=int),
+        processes=True,
+    ),
+}
+
+
+def register_pool(
+    name: str,
+    factory: Callable[[int], Executor],
+    max_workers: int,
+    processes: bool = False,
+) -> None:
+    POOLS[name] = ExecutorPool(name, factory, max_workers, processes)
+
+
+def pool_metrics() -> Dict[str, Tuple[PoolMetrics, int]]:
+    """Metrics and queue depth of every pool"""
+    return {name: (pool.metrics, pool.queue_depth) for name, pool in POOLS.items()}
+
+
+def shutdown_pools(wait: bool = True) -> None:
+    for pool in POOLS.values():
+        if pool.executor is not None:
+            pool.executor.shutdown(wait=wait, cancel_futures=True)
+            pool.executor = None
+
+
+def _run_timed(func: Callable, args: tuple, kwargs: dict) -> Tuple[float, Any]:
+    # time.time so the start can be compared across processes
+    started_at = time.time()
+    return started_at, func(*args, **kwargs)
+
+
+def _run_imported(
+    module: str, qualname: str, args: tuple, kwargs: dict
+) -> Tuple[float, Any]:
+    # The decorated name resolves to the coroutine wrapper, which cannot be
+    # pickled, so the process imports it and unwraps the function
+    target: Any = importlib.import_module(module)
+    for name in qualname.split("."):
+        target = getattr(target, name)
+    return _run_timed(target.__wrapped__, args, kwargs)
+
+
+def asAsync(
+    func: Optional[Callable] = None,
+    *,
+    pool: str = "io",
+    timeout: Optional[float] = None,
+):
+    """
+    Run a blocking function in one of the named executor pools.
+
+    Works with or without arguments, @asAsync or @asAsync(pool="cpu",
+    timeout=30). A call can set its own timeout with the _timeout keyword.
+    Cancelling the call, or running out of time, cancels it if it has not
+    started yet; once running, it finishes in the background.
+    """
+
+    def decorator(func: Callable):
+        @wraps(func)
+        async def run(*args, _timeout: Optional[float] = timeout, **kwargs):
+            executor_pool = POOLS[pool]
+            metrics = executor_pool.metrics
+            loop = asyncio.get_running_loop()
+            if executor_pool.processes:
+                call = partial(
+                    _run_imported, func.__module__, func.__qualname__, args, kwargs
+                )
+            else:
+                call = partial(_run_timed, func, args, kwargs)
+            submitted_at = time.time()
+            metrics.submitted += 1
+            try:
+                future = loop.run_in_executor(executor_pool.get_executor(), call)
+                started_at, result = await asyncio.wait_for(future, _timeout)
+            except asyncio.TimeoutError:
+                metrics.timed_out += 1
+                raise
+            except asyncio.CancelledError:
+                metrics.cancelled += 1
+                raise
+            except Exception:
+                metrics.failed += 1
+                raise
+            executor_pool.record_start(submitted_at, started_at)
+            metrics.completed += 1
+            return result
 
+        return run
 
-def asAsync(func):
-    @wraps(func)
-    async def run(*args, **kwargs):
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, func, *args)
-    return run
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -1,8 +1,73 @@
-from logging import DEBUG, getLogger, handlers, Formatter, Logger, StreamHandler, INFO
+from logging import (
+    DEBUG,
+    ERROR,
+    getLogger,
+    handlers,
+    Formatter,
+    Handler,
+    Logger,
+    LogRecord,
+    StreamHandler,
+    INFO,
+)
+from typing import Any, Dict, List, Optional
+import atexit
+import json
+import queue
+import random
+
+from decouple import Csv, config
+
+
+class BoundedQueueHandler(handlers.QueueHandler):
+    """Queue handler that drops the records instead of blocking when full"""
+
+    def __init__(self, maxsize: int) -> None:
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+
+    def enqueue(self, record: LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        # The listener runs in this process, so the record is handed over as
+        # is and the message is only formatted on the listener thread
+        return record
+
+
+class JsonFormatter(Formatter):
+    """One json object per line with the event name and its fields"""
+
+    def format(self, record: LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "at": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, "event", None),
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_pairs(pairs: List[str]) -> Dict[str, str]:
+    """Parse 'name=value' pairs, like discord.gateway=INFO"""
+    split = (pair.split("=", 1) for pair in pairs if "=" in pair)
+    return {name.strip(): value.strip() for name, value in split}
 
 
 class AppLogger:
     logger: Logger
+    # Fraction of the records of every event type that is logged
+    _sample_rates: Dict[str, float] = {}
+    # Set by setup() when the handlers run on the listener thread
+    _queue_handler: Optional[BoundedQueueHandler] = None
+    _queue_listener: Optional[handlers.QueueListener] = None
 
     def __init__(self) -> None:
         self.logger = getLogger("discord")
@@ -18,10 +83,74 @@ class AppLogger:
         formatter = Formatter(
             "[{asctime}] [{levelname:<8}] {name}: {message}", dt_fmt, style="{"
         )
-        handler.setFormatter(formatter)
+        if config("LOG_FORMAT", default="text") == "json":
+            handler.setFormatter(JsonFormatter(datefmt=dt_fmt))
+        else:
+            handler.setFormatter(formatter)
         console_formatter = StreamHandler()
         console_formatter.setFormatter(formatter)
 
-        self.logger.addHandler(handler)
-        self.logger.addHandler(console_formatter)
-        self.logger.setLevel(DEBUG)
+        if config("LOG_QUEUE", default=True, cast=bool):
+            self.add_queued_handlers(
+                handler,
+                console_formatter,
+                maxsize=config("LOG_QUEUE_SIZE", default=10_000, cast=int),
+            )
+        else:
+            self.logger.addHandler(handler)
+            self.logger.addHandler(console_formatter)
+        self.logger.setLevel(config("LOG_LEVEL", default="DEBUG").upper())
+        levels = parse_pairs(config("LOG_LEVELS", default="", cast=Csv()))
+        for name, level in levels.items():
+            getLogger(name).setLevel(level.upper())
+        rates = parse_pairs(config("LOG_SAMPLING", default="", cast=Csv()))
+        AppLogger._sample_rates = {event: float(rate) for event, rate in rates.items()}
+
+    def log_event(
+        self, event: str, msg: str, *args: Any, level: int = INFO, **fields: Any
+    ) -> None:
+        """
+        Log a structured event, the fields end up as keys of the json lines.
+
+        The message is formatted with the args by the handlers, only when the
+        level is enabled and the event is sampled. Errors are always logged.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = AppLogger._sample_rates.get(event, 1)
+        if level < ERROR and rate < 1:
+            if random.random() >= rate:
+                return
+            fields["sample_rate"] = rate
+        self.logger.log(
+            level, msg, *args, extra={"event": event, "fields": fields}, stacklevel=2
+        )
+
+    def add_queued_handlers(self, *targets: Handler, maxsize: int = 10_000) -> None:
+        """
+        Only enqueue the records on the calling thread, the formatting and the
+        file writes and rotations happen on a listener thread. Records are
+        dropped when the listener falls behind by more than maxsize records.
+        """
+        queue_handler = BoundedQueueHandler(maxsize)
+        listener = handlers.QueueListener(
+            queue_handler.queue, *targets, respect_handler_level=True
+        )
+        listener.start()
+        self.logger.addHandler(queue_handler)
+        AppLogger._queue_handler = queue_handler
+        AppLogger._queue_listener = listener
+        # Drain what is left in the queue on exit
+        atexit.register(self.stop_queue)
+
+    def stop_queue(self) -> None:
+        """Write the queued records and stop the listener thread"""
+        listener, AppLogger._queue_listener = AppLogger._queue_listener, None
+        if listener is not None:
+            listener.stop()
+
+    @property
+    def dropped_records(self) -> int:
+        """Records dropped because the logging queue was full"""
+        handler = AppLogger._queue_handler
+        return 0 if handler is None else handler.dropped
@@ -0,0 +1,149 @@
+from configparser import ConfigParser, Error as ConfigParserError
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from os import path
+import asyncio
+import os
+import signal
+
+from decouple import (
+    Config,
+    RepositoryEmpty,
+    RepositoryEnv,
+    config,
+)
+
+from utils.logger import AppLogger
+
+SYSTEM_PROMPT = 'Você agora é conhecido como: EVA 01, uma unidade Mecha de combate descrita no Anime Evangelion. A Unidade Eva 01 foi produzido em 2004 pelo Terceiro Anexo de Laboratórios de Evolução Artificial da antiga Gehirn, em Hakone, como um modelo "Evangelion Test Type".'
+
+
+@dataclass(frozen=True, slots=True)
+class OpenAiSettings:
+    model: str = "gpt-3.5-turbo"
+    completion_model: str = "text-davinci-003"
+    temperature: float = 0.8
+    max_tokens: int = 1000
+    system_prompt: str = SYSTEM_PROMPT
+
+
+# Setting, its name in the environment and .env, and in the SETTINGS
+# section of config.ini
+OPEN_AI_SETTINGS = {
+    "model": ("OPEN_AI_MODEL", "open_ai_model", str),
+    "completion_model": ("OPEN_AI_COMPLETION_MODEL", "open_ai_completion_model", str),
+    "temperature": ("OPEN_AI_TEMPERATURE", "open_ai_temperature", float),
+    "max_tokens": ("OPEN_AI_MAX_TOKENS", "open_ai_max_tokens", int),
+    "system_prompt": ("OPEN_AI_SYSTEM_PROMPT", "open_ai_system_prompt", str),
+}
+
+
+class Settings:
+    """
+    Settings loaded once from the environment, .env and config.ini, in this
+    order of precedence, with the defaults for what none of them sets.
+
+    A reload reads the files again and replaces the frozen settings as a
+    whole, so a request that took them keeps a consistent set. A reload that
+    fails keeps the settings in use. Reloads happen on SIGHUP and, with a
+    watch interval, when the files change.
+    """
+
+    _shared: Optional["Settings"] = None
+
+    def __init__(
+        self,
+        env_file: str = ".env",
+        config_file: str = "config.ini",
+        watch_interval: float = 0,
+    ) -> None:
+        self.logger = AppLogger().logger
+        self.env_file = env_file
+        self.config_file = config_file
+        self.watch_interval = watch_interval
+        self.reloads = 0
+        self._watcher: Optional[asyncio.Task] = None
+        self._mtimes = self._file_mtimes()
+        self.openai = self._load()
+
+    @classmethod
+    def shared(cls) -> "Settings":
+        """Settings of the bot, loaded on the first use"""
+        if cls._shared is None:
+            cls._shared = cls(
+                watch_interval=config("SETTINGS_WATCH_INTERVAL", default=0, cast=float)
+            )
+        return cls._shared
+
+    def _file_mtimes(self) -> Dict[str, float]:
+        return {
+            file: os.stat(file).st_mtime
+            for file in (self.env_file, self.config_file)
+            if path.isfile(file)
+        }
+
+    def _load(self) -> OpenAiSettings:
+        env = Config(
+            RepositoryEnv(self.env_file)
+            if path.isfile(self.env_file)
+            else RepositoryEmpty()
+        )
+        ini = ConfigParser()
+        ini.read(self.config_file, encoding="utf-8")
+        section = ini["SETTINGS"] if ini.has_section("SETTINGS") else {}
+
+        values: Dict[str, Any] = {}
+        for field, (env_name, ini_name, cast) in OPEN_AI_SETTINGS.items():
+            # Empty values are the same as unset ones
+            value = env(env_name, default="") or section.get(ini_name, "")
+            if value:
+                values[field] = cast(value)
+        return OpenAiSettings(**values)
+
+    def reload(self) -> None:
+        self._mtimes = self._file_mtimes()
+        try:
+            openai = self._load()
+        except (ValueError, OSError, ConfigParserError) as e:
+            self.logger.error(
+                f"[{self.__class__.__name__}] Reload failed, keeping the settings {e}"
+            )
+            return
+        if openai != self.openai:
+            self.logger.info(f"[{self.__class__.__name__}] Reloaded {openai}")
+        self.openai = openai
+        self.reloads += 1
+
+    def start(self) -> None:
+        """Reload on SIGHUP and, with a watch interval, on file changes"""
+        loop = asyncio.get_running_loop()
+        if hasattr(signal, "SIGHUP"):
+            try:
+                loop.add_signal_handler(signal.SIGHUP, self.reload)
+            except (NotImplementedError, RuntimeError):
+                # Not the main thread, or a loop without signal support
+                pass
+        if self.watch_interval > 0 and self._watcher is None:
+            self._watcher = loop.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            if self._file_mtimes() != self._mtimes:
+                try:
+                    self.reload()
+                except Exception as e:
+                    # The next change is still picked up
+                    self.logger.error(
+                        f"[{self.__class__.__name__}] Reload failed {e}"
+                    )
+
+    def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        if hasattr(signal, "SIGHUP"):
+            try:
+                asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            except (NotImplementedError, RuntimeError):
+                pass
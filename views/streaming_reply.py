@@ -0,0 +1,84 @@
+from contextlib import aclosing
+from typing import AsyncGenerator, List, Optional, Union
+import asyncio
+
+import discord
+
+MESSAGE_LIMIT = 2000
+
+
+class StreamingReply:
+    """
+    Shows a text that is still being generated in discord messages.
+
+    The first piece of text is sent right away, then the message is edited
+    when every_tokens pieces arrived or interval seconds passed since the
+    last edit, but never more than once every min_interval seconds so the
+    edits stay within the rate limits. Text past the message limit goes on
+    in new messages.
+    """
+
+    def __init__(
+        self,
+        target: Union[discord.abc.Messageable, discord.Message],
+        every_tokens: int = 20,
+        interval: float = 1.5,
+        min_interval: float = 1,
+        cursor: str = " ▌",
+    ) -> None:
+        self.target = target
+        self.every_tokens = every_tokens
+        self.interval = interval
+        self.min_interval = min_interval
+        self.cursor = cursor
+        self.text = ""
+        self.messages: List[discord.Message] = []
+        self._rendered: List[str] = []
+        self._pending = 0
+        self._last_render: Optional[float] = None
+
+    async def consume(self, chunks: AsyncGenerator[str, None]) -> str:
+        """Show the chunks as they arrive, returns the whole text"""
+        # A failed edit closes the stream instead of leaving it open
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                self.text += chunk
+                self._pending += 1
+                if self._should_render():
+                    await self._render()
+        await self._render(final=True)
+        return self.text
+
+    def _should_render(self) -> bool:
+        if self._last_render is None:
+            return True
+        elapsed = asyncio.get_running_loop().time() - self._last_render
+        if elapsed < self.min_interval:
+            return False
+        return self._pending >= self.every_tokens or elapsed >= self.interval
+
+    def _pages(self, final: bool) -> List[str]:
+        size = MESSAGE_LIMIT - len(self.cursor)
+        pages = [self.text[i : i + size] for i in range(0, len(self.text), size)]
+        if not final and len(pages) != 0:
+            pages[-1] += self.cursor
+        return pages
+
+    async def _render(self, final: bool = False) -> None:
+        self._pending = 0
+        self._last_render = asyncio.get_running_loop().time()
+        for i, page in enumerate(self._pages(final)):
+            if i < len(self.messages):
+                if self._rendered[i] != page:
+                    await self.messages[i].edit(content=page)
+                    self._rendered[i] = page
+                continue
+            self.messages.append(await self._send(page))
+            self._rendered.append(page)
+
+    async def _send(self, content: str) -> discord.Message:
+        if len(self.messages) != 0:
+            return await self.messages[-1].channel.send(content)
+        if isinstance(self.target, discord.Message):
+            return await self.target.reply(content)
+        return await self.target.send(content)